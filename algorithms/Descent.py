@@ -1,183 +1,250 @@
-from architecture.Utils import Neighborhood
-
-
-# Generating insert neighborhood
-def generate_insert_neighborhood(solution):  # size: (n - 1)^2
-    neighborhood = []
-    n = len(solution)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                neighbor = list(solution)
-                neighbor.insert(j, neighbor.pop(i))
-                neighborhood.append(neighbor)
-    return list(set(tuple(neighbor) for neighbor in neighborhood))
-
-
-# Generating swap neighborhood
-def generate_swap_neighborhood(solution):  # size: n(n - 1)/2
-    neighborhood = []
-    n = len(solution)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                neighbor = list(solution)
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                neighborhood.append(neighbor)
-    return list(set(tuple(neighbor) for neighbor in neighborhood))
+from algorithms.Moves import apply_move, evaluate_moves, evaluate_moves_batch, generate_vertex_moves, \
+    generate_granular_vertex_moves, get_positions
+from algorithms.RouteImprovement import improve_routes
+from architecture.Evaluator import MAX_ROUTE_LENGTH
+from architecture.Stats import Stats
+from architecture.Utils import Improvement, Neighborhood, Split
+import architecture.Parallel as Parallel
+import itertools
+import time
 
 
 # Descent algorithm
-def descent_algorithm(graph, init_solution=None, neighborhood_type=Neighborhood.INSERT):
-
-    # Calculating cost of given routes
-    def calculate_cost(routes):
-        total_cost = 0
-        for route in routes:
-            for vertex in range(len(route) - 1):
-                u, v = route[vertex], route[vertex + 1]
-                total_cost += graph.get_weight(u, v)
-        return round(total_cost, 2)
-
-    # Checking if vehicle with specified capacity can serve given solution
-    def check_if_can_serve(partial_solution, chosen_vehicle):
-        discharged = sum([graph.get_vertex(vertex).discharged for vertex in partial_solution])
-        demands = [graph.get_vertex(vertex).get_vertex_demand() for vertex in partial_solution]
-        current_loads = [0] * len(demands)
-        initial_load = 0
-
-        # Check number of batteries
-        if discharged > chosen_vehicle.capacity:
-            return None
-
-        for idx, demand in enumerate(demands):
-            if demand > 0:
-                if idx == 0:
-                    current_loads[idx] = 0
-                    initial_load = demand
-                else:  # idx > 0
-                    current_load = current_loads[idx - 1] - demand
-                    if current_load > 0:
-                        current_loads[idx] = current_load
-                    else:  # current_load < 0
-                        current_loads[idx] = 0
-
-                    vertex_load = demand - current_loads[idx - 1]
-                    if vertex_load > 0:
-                        initial_load += vertex_load
-            else:  # demand < 0
-                demand = abs(demand)
-                if idx == 0:
-                    current_loads[idx] = demand
-                    initial_load = 0
-                else:  # idx > 0
-                    current_loads[idx] = current_loads[idx - 1] + demand
-
-        # Vehicle load check
-        for current_load in current_loads:
-            if current_load * 5 > chosen_vehicle.capacity - discharged:
-                return None
-
-        # Route simulating
-        vehicle_load = initial_load * 5
-        for demand in demands:
-            if vehicle_load > chosen_vehicle.capacity - discharged:
-                return None  # False
-            vehicle_load -= demand * 5
-
-        return [initial_load, discharged]
-
-    # Creating route, adding warehouses to both ends
-    def create_route(route, warehouse):
-        return [warehouse.index] + list(route) + [warehouse.index]
-
-    # Fitness function calculating solution fitness value
-    def fitness_function(solution):
-        route = None
-        route_load = None
-
-        routes = []
-        vehicles = []
-        init_loads = []
-
-        solution_idx = 0
-        solution_begin = 0
-
-        closest_warehouse = graph.get_closest_warehouse(solution[solution_idx])
-        chosen_vehicle = closest_warehouse.select_vehicle()
-
-        while solution_idx < len(solution):
-            init_load = check_if_can_serve(solution[solution_begin:solution_idx+1], chosen_vehicle)
-
-            if init_load is not None:
-                if route is None:
-                    vehicles.append(chosen_vehicle.capacity)
-
-                route = solution[solution_begin:solution_idx+1]
-                route_load = init_load
-                solution_idx += 1
-            else:  # init_load == 0
-                solution_begin = solution_idx
-
-                if route is not None:
-                    routes.append(
-                        create_route(
-                            route,
-                            closest_warehouse
-                        )
-                    )
-
-                    closest_warehouse = graph.get_closest_warehouse(solution[solution_begin])
-                    init_loads.append(route_load)
-                    route = None
-                chosen_vehicle = closest_warehouse.select_vehicle()
-
-        if route:
-            routes.append(
-                create_route(
-                    route,
-                    closest_warehouse
-                )
-            )
-            init_loads.append(route_load)
-
-        return calculate_cost(routes), routes, vehicles, init_loads
+# local_optimum - keep descending until no improving move exists, otherwise make a single step
+# dont_look_bits - skip vertices whose moves did not improve, until their neighborhood changes
+# candidates_k - granular neighborhood, only moves placing vertex next to one of its k nearest clients
+#                are checked (full neighborhood by default)
+# route_improvement - once no move improves, routes are improved with 2-opt and Or-opt (see improve_routes())
+#                     and descent goes on from the improved solution
+# split_type - splitting solutions into routes (Split.OPTIMAL is not supported by batch evaluation)
+# max_route_length - longest route of optimal split in clients (None - not limited)
+# batch_size - evaluate moves of scanned vertices in NumPy batches of at least given size
+# cache - FitnessCache of Split.OPTIMAL solutions reused for revisited solutions (not used by batch evaluation)
+# stats - Stats filled with run counters and phase times
+# trace - Trace streaming cost of the initial solution and of every improvement (applied move or route improvement)
+def descent_algorithm(graph,
+                      init_solution=None,
+                      neighborhood_type=Neighborhood.INSERT,
+                      local_optimum=False,
+                      improvement_type=Improvement.BEST_IMPROVEMENT,
+                      dont_look_bits=False,
+                      candidates_k=None,
+                      route_improvement=False,
+                      split_type=Split.GREEDY,
+                      max_route_length=MAX_ROUTE_LENGTH,
+                      batch_size=None,
+                      deadline=None,
+                      seed=None,
+                      cache=None,
+                      stats=None,
+                      trace=None):
+
+    # Shared solution evaluator
+    evaluator = graph.get_evaluator()
+    evaluator.max_route_length = max_route_length
+    rng = graph.get_rng(seed)
+
+    if cache is not None:
+        cache.start_run(split_type)
+    if stats is not None:
+        stats.start_run(evaluator, cache)
+    if trace is not None:
+        trace.start(evaluator)
 
     # Descent algorithm
     solution = None
     if init_solution is not None:
         solution = init_solution.astype(int).tolist()
     else:
-        solution = graph.get_vertices_permutation()
-
-    neighborhood = []
-    if neighborhood_type == Neighborhood.INSERT:
-        neighborhood = generate_insert_neighborhood(solution)
-
-    if neighborhood_type == Neighborhood.SWAP:
-        neighborhood = generate_swap_neighborhood(solution)
-
-    solution_val, solution_routes, solution_vehicles, solution_init_loads = fitness_function(solution)
-    solution_params = (
-        solution,
-        solution_val,
-        solution_routes,
-        solution_vehicles,
-        solution_init_loads
-    )
+        solution = graph.get_vertices_permutation(rng)
+
+    solution_params = evaluator.fitness_function(solution, rng, cache, split_type)
+    if trace is not None:
+        trace.record(solution_params.cost)
+
+    candidates = evaluator.get_candidates(candidates_k) if candidates_k is not None else None
+    positions = None
+
+    solution_len = len(solution)
+    dont_look = [False] * (solution_len + 1)
+    vertex_begin = 0
+
+    base_solution = None
+    best_move = None
+    best_val = None
+    best_params = None
+
+    # Checking evaluated moves (move, neighbor cost, neighbor Solution or batch row) of scanned vertex,
+    # returns True once the move is selected
+    def check_vertex(vertex, evaluated_moves):
+        nonlocal best_move, best_val, best_params
+
+        improved = False
+        for move, neighbor_val, neighbor_params in evaluated_moves:
+            if base_solution.cost > neighbor_val:
+                improved = True
+                if best_val > neighbor_val:
+                    best_move = move
+                    best_val = neighbor_val
+                    best_params = neighbor_params
+
+                if improvement_type == Improvement.FIRST_IMPROVEMENT:
+                    break
+
+        if dont_look_bits and not improved:
+            dont_look[vertex] = True
+
+        return best_move is not None and improvement_type == Improvement.FIRST_IMPROVEMENT
+
+    # Evaluating moves of scanned vertices as one batch, returns position of vertex the move is selected at
+    def check_batch(batch_vertices, batch_moves):
+        evaluated_moves = evaluate_moves_batch(
+            evaluator,
+            solution,
+            batch_moves,
+            neighborhood_type,
+            len(batch_moves),
+            rng,
+            split_type
+        )
+        for vertex_idx, vertex, num_moves in batch_vertices:
+            if check_vertex(vertex, list(itertools.islice(evaluated_moves, num_moves))):
+                return vertex_idx
+        return None
+
+    while deadline is None or time.time() < deadline:
+        if stats is not None:
+            scan_begin_time = time.perf_counter()
+
+        # Neighbors are evaluated from their first changed position only
+        base_solution = solution_params
+        base_states = evaluator.get_split_states(solution_params, split_type)
+        if candidates is not None:
+            positions = get_positions(solution)
+
+        if stats is not None:
+            scan_evaluate_time = time.perf_counter()
+            scan_evaluations = Stats.get_counters(evaluator, cache)
+        best_move = None
+        best_val = base_solution.cost
+        best_params = None
+
+        looked = [False] * (solution_len + 1)
+        batch_vertices = []
+        batch_moves = []
+        for vertex_offset in range(solution_len):
+            vertex_idx = (vertex_begin + vertex_offset) % solution_len
+            vertex = solution[vertex_idx]
+            if dont_look[vertex]:
+                continue
+            looked[vertex] = True
+            if candidates is None:
+                moves = generate_vertex_moves(solution, vertex_idx, neighborhood_type, looked)
+            else:
+                moves = generate_granular_vertex_moves(solution, vertex_idx, neighborhood_type, candidates, positions)
+
+            if batch_size is None:
+                evaluated_moves = evaluate_moves(
+                    evaluator,
+                    solution,
+                    moves,
+                    neighborhood_type,
+                    base_solution,
+                    base_states,
+                    rng,
+                    cache,
+                    split_type
+                )
+                if check_vertex(vertex, evaluated_moves):
+                    vertex_begin = vertex_idx + 1
+                    break
+            else:
+                moves = list(moves)
+                batch_vertices.append((vertex_idx, vertex, len(moves)))
+                batch_moves.extend(moves)
+                if len(batch_moves) >= batch_size:
+                    selected_idx = check_batch(batch_vertices, batch_moves)
+                    batch_vertices = []
+                    batch_moves = []
+                    if selected_idx is not None:
+                        vertex_begin = selected_idx + 1
+                        break
+        else:
+            if batch_moves:
+                selected_idx = check_batch(batch_vertices, batch_moves)
+                if selected_idx is not None:
+                    vertex_begin = selected_idx + 1
+
+        if stats is not None:
+            scan_end_time = time.perf_counter()
+            stats.add_time('neighborhood_build', scan_evaluate_time - scan_begin_time)
+            stats.add_time('neighborhood_evaluation', scan_end_time - scan_evaluate_time)
+            stats.count('neighborhood_scans')
+
+            # Evaluated moves, including these found in cache
+            scan_counters = Stats.get_counters(evaluator, cache)
+            stats.count('neighborhood_moves', scan_counters['evaluations'] - scan_evaluations['evaluations']
+                        + scan_counters.get('cache_hits', 0) - scan_evaluations.get('cache_hits', 0))
+
+        if best_move is None:
+            if not route_improvement:
+                break
+
+            # Clients order within routes changes, giant tour neighborhood is looked at again
+            improved_params = improve_routes(graph, solution_params, stats=stats)
+            if improved_params.cost >= solution_params.cost:
+                break
+
+            solution[:] = improved_params.tour
+            solution_params = improved_params
+            dont_look[:] = [False] * (solution_len + 1)
+        else:
+            # Batch evaluation gives costs only, selected neighbor routes are recovered from its batch row
+            if batch_size is not None:
+                best_params = evaluator.get_solution(*best_params)
+
+            apply_move(solution, best_move, neighborhood_type)
+            solution_params = best_params
+
+            # Neighborhood changed around both ends of the move
+            for idx in best_move:
+                for neighbor_idx in range(max(idx - 1, 0), min(idx + 2, solution_len)):
+                    dont_look[solution[neighbor_idx]] = False
+
+            if stats is not None:
+                stats.count('moves_applied')
+
+        if trace is not None:
+            trace.record(solution_params.cost)
+
+        if not local_optimum:
+            break
+
+    if stats is not None:
+        stats.end_run(evaluator, cache)
+    if cache is not None:
+        cache.end_run()
 
-    for neighbor in neighborhood:
-        neighbor_val, neighbor_routes, neighbor_vehicles, neighbor_init_loads = fitness_function(neighbor)
-
-        if solution_params[1] > neighbor_val:
-            solution_params = (
-                neighbor,
-                neighbor_val,
-                neighbor_routes,
-                neighbor_vehicles,
-                neighbor_init_loads
-            )
     if init_solution is not None:
-        return solution_params[0]
+        return solution
     else:
         return solution_params
+
+
+# Running single descent in worker process, skipped once the deadline has passed
+# (descent is the outermost run of worker cache, so it does not depend on descents run by the worker before)
+# Returns descent result and its worker stats (if collected)
+def run_descent(descent_params, deadline, rng, collect_stats=False):
+    if time.time() >= deadline:
+        return None, None
+
+    stats = Stats() if collect_stats else None
+    descent_instance = descent_algorithm(
+        Parallel.worker_graph,
+        deadline=deadline,
+        seed=rng,
+        cache=Parallel.worker_cache,
+        stats=stats,
+        **descent_params
+    )
+    return descent_instance, stats
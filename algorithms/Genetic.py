@@ -1,4 +1,10 @@
-from architecture.Utils import Crossover
+from architecture.Evaluator import MAX_ROUTE_LENGTH
+from architecture.Parallel import create_pool
+from architecture.RandomGenerator import RandomGenerator
+from architecture.Stats import Stats
+from architecture.Utils import Crossover, Split
+import architecture.Parallel as Parallel
+import itertools
 import warnings
 import pygad
 import numpy
@@ -8,86 +14,246 @@ import time
 warnings.filterwarnings("ignore", message="The 'delay_after_gen' parameter is deprecated*")
 
 
+# Evaluating solutions one by one, returns costs in solutions order, index and Solution of the first best solution
+# (rng - random generator shared by all solutions or list of random generators of every solution)
+def evaluate_solutions(evaluator, solutions, rng, cache=None, split_type=Split.GREEDY):
+    costs = []
+    best_idx = None
+    best_params = None
+
+    rngs = rng if isinstance(rng, list) else itertools.repeat(rng)
+    for idx, (solution, solution_rng) in enumerate(zip(solutions, rngs)):
+        params = evaluator.fitness_function(solution, solution_rng, cache, split_type)
+        costs.append(params.cost)
+
+        if best_params is None or params.cost < best_params.cost:
+            best_idx = idx
+            best_params = params
+
+    return costs, best_idx, best_params
+
+
+# Evaluating solutions in worker process, every solution with random generator of its own seed sequence
+# (worker cache of the pool holds Split.OPTIMAL solutions of this run only, see FitnessCache.start_run())
+# max_route_length - optimal split limit of the main process evaluator
+# Returns evaluate_solutions() result and worker stats (if collected)
+def evaluate_solutions_worker(solutions,
+                              seed_sequences,
+                              split_type=Split.GREEDY,
+                              max_route_length=MAX_ROUTE_LENGTH,
+                              collect_stats=False):
+    evaluator = Parallel.worker_graph.get_evaluator()
+    evaluator.max_route_length = max_route_length
+    stats = Stats() if collect_stats else None
+
+    if stats is not None:
+        stats.start_run(evaluator, Parallel.worker_cache)
+
+    rngs = [RandomGenerator(seed_sequence) for seed_sequence in seed_sequences]
+    costs, best_idx, best_params = evaluate_solutions(evaluator, solutions, rngs, Parallel.worker_cache, split_type)
+    if stats is not None:
+        stats.end_run(evaluator, Parallel.worker_cache)
+
+    return costs, best_idx, best_params, stats
+
+
+# Evaluating whole population at once, returns the same as evaluate_solutions()
+# batch_size - vectorized NumPy evaluation in batches of given size
+# pool - process pool evaluating population split into one chunk per worker (stats merged from workers),
+#        every solution gets own random stream, so results do not depend on number of workers
+def evaluate_population(evaluator,
+                        solutions,
+                        rng,
+                        cache=None,
+                        batch_size=None,
+                        pool=None,
+                        workers=None,
+                        stats=None,
+                        split_type=Split.GREEDY):
+
+    if pool is not None:
+        chunk_size = -(-len(solutions) // workers)
+        chunk_begins = range(0, len(solutions), chunk_size)
+        chunks = [solutions[begin:begin + chunk_size] for begin in chunk_begins]
+        seed_sequences = rng.seed_sequence.spawn(len(solutions))
+
+        costs = []
+        best_idx = None
+        best_params = None
+        chunk_results = pool.map(
+            evaluate_solutions_worker,
+            chunks,
+            [seed_sequences[begin:begin + chunk_size] for begin in chunk_begins],
+            [split_type] * len(chunks),
+            [evaluator.max_route_length] * len(chunks),
+            [stats is not None] * len(chunks)
+        )
+        for begin, (chunk_costs, chunk_best_idx, chunk_best_params, chunk_stats) in zip(chunk_begins, chunk_results):
+            if chunk_stats is not None:
+                stats.merge(chunk_stats)
+
+            costs.extend(chunk_costs)
+            if best_params is None or chunk_best_params.cost < best_params.cost:
+                best_idx = begin + chunk_best_idx
+                best_params = chunk_best_params
+
+        return costs, best_idx, best_params
+
+    if batch_size is not None:
+        costs = []
+        best_idx = None
+        best_params = None
+        for begin in range(0, len(solutions), batch_size):
+            batch = numpy.asarray(solutions[begin:begin + batch_size], dtype=numpy.int64)
+            batch_costs, route_begins, capacities = evaluator.fitness_function_batch(batch, rng, split_type)
+            batch_costs = batch_costs.tolist()
+            costs.extend(batch_costs)
+
+            # Routes are recovered only for the batch best solution
+            row = batch_costs.index(min(batch_costs))
+            if best_params is None or batch_costs[row] < best_params.cost:
+                best_idx = begin + row
+                best_params = evaluator.get_solution(batch[row], route_begins[row], capacities[row])
+
+        return costs, best_idx, best_params
+
+    return evaluate_solutions(evaluator, solutions, rng, cache, split_type)
+
+
+# Decoding chromosome into vertices order
+def decode_solution(solution, crossover_type):
+    if crossover_type == Crossover.ORDER_CROSSOVER:
+        return [int(x) for x in solution]
+    elif crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
+        return (numpy.argsort(solution) + 1).tolist()
+
+
+# Getting pygad fitness functions of (hybrid) genetic algorithm - calculating solution fitness value and fitness values
+# of whole population at once (see evaluate_population()), returned with function getting best Solution found
+# Improvements of the best solution are recorded by trace, otherwise appended to all_solutions (fitness values)
+def get_fitness_functions(evaluator,
+                          crossover_type,
+                          rng,
+                          all_solutions,
+                          cache=None,
+                          batch_size=None,
+                          pool=None,
+                          workers=None,
+                          stats=None,
+                          trace=None,
+                          split_type=Split.GREEDY):
+
+    # Best solution found (Solution)
+    solution_params = None
+
+    # Fitness function calculating solution fitness value
+    def fitness_function(ga_instance, solution, solution_id):
+        solution = decode_solution(solution, crossover_type)
+
+        params = evaluator.fitness_function(solution, rng, cache, split_type)
+        fitness_value = -params.cost
+
+        nonlocal solution_params
+        if solution_params is None or params.cost < solution_params.cost:
+            solution_params = params
+            if trace is not None:
+                trace.record(params.cost)
+            else:
+                all_solutions.append(fitness_value)
+
+        return fitness_value
+
+    # Fitness function calculating fitness values of whole population,
+    # best solution and improvements history are merged afterwards in population order
+    def population_fitness_function(ga_instance, population, solutions_ids):
+        solutions = [decode_solution(solution, crossover_type) for solution in population]
+
+        costs, _, best_params = evaluate_population(
+            evaluator,
+            solutions,
+            rng,
+            cache,
+            batch_size,
+            pool,
+            workers,
+            stats,
+            split_type
+        )
+        fitness_values = [-cost for cost in costs]
+
+        nonlocal solution_params
+        best_value = -solution_params.cost if solution_params is not None else float('-inf')
+        for fitness_value in fitness_values:
+            if fitness_value > best_value:
+                best_value = fitness_value
+                if trace is not None:
+                    trace.record(-fitness_value)
+                else:
+                    all_solutions.append(fitness_value)
+
+        if solution_params is None or best_params.cost < solution_params.cost:
+            solution_params = best_params
+
+        return fitness_values
+
+    def get_best_solution():
+        return solution_params
+
+    return fitness_function, population_fitness_function, get_best_solution
+
+
+# Getting pygad callbacks timing phases between operators as laps of stats (no callbacks without stats)
+def get_lap_callbacks(stats):
+    if stats is None:
+        return {}
+
+    def on_start(ga_instance):
+        stats.lap()
+
+    def on_fitness(ga_instance, population_fitness):
+        stats.lap('fitness')
+
+    def on_parents(ga_instance, selected_parents):
+        stats.lap('selection')
+
+    def on_crossover(ga_instance, offspring_crossover):
+        stats.lap('crossover')
+
+    def on_mutation(ga_instance, offspring_mutation):
+        stats.lap('mutation')
+
+    return {
+        'on_start': on_start,
+        'on_fitness': on_fitness,
+        'on_parents': on_parents,
+        'on_crossover': on_crossover,
+        'on_mutation': on_mutation
+    }
+
+
 def genetic_algorithm(
         graph,
         num_generations,
         time_limit,
-        crossover_type):
+        crossover_type,
+        split_type=Split.GREEDY,
+        max_route_length=MAX_ROUTE_LENGTH,
+        seed=None,
+        cache=None,
+        batch_size=None,
+        workers=None,
+        stats=None,
+        trace=None):
 
     # 'Global' time counter
     time_start = 0
 
-    # Global list to store best solution
-    solution_params = (
-        [],             # solution
-        float('-inf'),  # solution_val
-        [],             # solution_routes
-        [],             # solution_vehicles
-        []              # solution_init_loads
-    )
-
     all_solutions = []
 
-    # Calculating cost of given routes
-    def calculate_cost(routes):
-        total_cost = 0
-        for route in routes:
-            for vertex in range(len(route) - 1):
-                u, v = route[vertex], route[vertex + 1]
-                total_cost += graph.get_weight(u, v)
-        return round(total_cost, 2)
-
-    # Checking if vehicle with specified capacity can serve given solution
-    def check_if_can_serve(partial_solution, chosen_vehicle):
-        discharged = sum([graph.get_vertex(vertex).discharged for vertex in partial_solution])
-        demands = [graph.get_vertex(vertex).get_vertex_demand() for vertex in partial_solution]
-        current_loads = [0] * len(demands)
-        initial_load = 0
-
-        # Check number of batteries
-        if discharged > chosen_vehicle.capacity:
-            return None
-
-        for idx, demand in enumerate(demands):
-            if demand > 0:
-                if idx == 0:
-                    current_loads[idx] = 0
-                    initial_load = demand
-                else:  # idx > 0
-                    current_load = current_loads[idx - 1] - demand
-                    if current_load > 0:
-                        current_loads[idx] = current_load
-                    else:  # current_load < 0
-                        current_loads[idx] = 0
-
-                    vertex_load = demand - current_loads[idx - 1]
-                    if vertex_load > 0:
-                        initial_load += vertex_load
-            else:  # demand < 0
-                demand = abs(demand)
-                if idx == 0:
-                    current_loads[idx] = demand
-                    initial_load = 0
-                else:  # idx > 0
-                    current_loads[idx] = current_loads[idx - 1] + demand
-
-        # Vehicle load check
-        for current_load in current_loads:
-            if current_load * 5 > chosen_vehicle.capacity - discharged:
-                return None
-
-        # Route simulating
-        vehicle_load = initial_load * 5
-        for demand in demands:
-            if vehicle_load > chosen_vehicle.capacity - discharged:
-                return None
-            vehicle_load -= demand * 5
-
-        return [initial_load, discharged]
-
-    # Creating route, adding warehouses to both ends
-    def create_route(route, warehouse):
-        return [warehouse.index] + list(route) + [warehouse.index]
+    # Shared solution evaluator
+    evaluator = graph.get_evaluator()
+    evaluator.max_route_length = max_route_length
+    rng = graph.get_rng(seed)
 
     # Roulette selection method
     def roulette_selection(fitness, num_parents, ga_instance):
@@ -95,7 +261,7 @@ def genetic_algorithm(
 
         probabilities = fitness / total_fitness
 
-        selected_indices = numpy.random.choice(range(len(fitness)), size=num_parents, p=probabilities)
+        selected_indices = rng.numpy.choice(range(len(fitness)), size=num_parents, p=probabilities)
         selected_parents = ga_instance.population[selected_indices]
 
         return selected_parents, selected_indices
@@ -108,7 +274,7 @@ def genetic_algorithm(
             parent1 = parents[idx % parents.shape[0], :].copy()
             parent2 = parents[(idx + 1) % parents.shape[0], :].copy()
 
-            split_point = numpy.random.choice(range(offspring_size[1]))
+            split_point = rng.numpy.choice(range(offspring_size[1]))
 
             parent1[split_point:] = parent2[split_point:]
 
@@ -126,7 +292,7 @@ def genetic_algorithm(
             parent1 = parents[idx % parents.shape[0], :].copy()
             parent2 = parents[(idx + 1) % parents.shape[0], :].copy()
 
-            split_points = sorted(numpy.random.choice(range(offspring_size[1]), size=2))
+            split_points = sorted(rng.numpy.choice(range(offspring_size[1]), size=2))
 
             mask = numpy.zeros(offspring_size[1], dtype=bool)
             mask[split_points[0]:split_points[1] + 1] = True
@@ -148,6 +314,10 @@ def genetic_algorithm(
 
     # Stop algorithm on given time
     def stop_at_generation(ga_instance):
+        if stats is not None:
+            stats.lap('fitness')
+            stats.count('generations')
+
         if time.time() - time_start >= time_limit:
             return "stop"
 
@@ -158,77 +328,6 @@ def genetic_algorithm(
         population_size = int(coefficient * chromosome_length + offset)
         return population_size
 
-    # Fitness function calculating solution fitness value
-    def fitness_function(ga_instance, solution, solution_id):
-
-        if crossover_type == Crossover.ORDER_CROSSOVER:
-            solution = [int(x) for x in solution]
-        elif crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
-            solution = list(numpy.argsort(solution) + 1)
-
-        route = None
-        route_load = None
-
-        routes = []
-        vehicles = []
-        init_loads = []
-
-        solution_idx = 0
-        solution_begin = 0
-
-        closest_warehouse = graph.get_closest_warehouse(solution[solution_idx])
-        chosen_vehicle = closest_warehouse.select_vehicle()
-
-        while solution_idx < len(solution):
-            init_load = check_if_can_serve(solution[solution_begin:solution_idx+1], chosen_vehicle)
-
-            if init_load is not None:
-                if route is None:
-                    vehicles.append(chosen_vehicle.capacity)
-
-                route = solution[solution_begin:solution_idx+1]
-                route_load = init_load
-                solution_idx += 1
-            else:  # init_load == 0
-                solution_begin = solution_idx
-
-                if route is not None:
-                    routes.append(
-                        create_route(
-                            route,
-                            closest_warehouse
-                        )
-                    )
-
-                    closest_warehouse = graph.get_closest_warehouse(solution[solution_begin])
-                    init_loads.append(route_load)
-                    route = None
-                chosen_vehicle = closest_warehouse.select_vehicle()
-
-        if route:
-            routes.append(
-                create_route(
-                    route,
-                    closest_warehouse
-                )
-            )
-            init_loads.append(route_load)
-
-        fitness_value = -calculate_cost(routes)
-
-        nonlocal solution_params
-        if fitness_value > solution_params[1]:
-            solution_params = (
-                solution,
-                fitness_value,
-                routes,
-                vehicles,
-                init_loads
-            )
-            all_solutions.append(fitness_value)
-
-        return fitness_value
-
     # Genetic algorithm
     crossover = None
     gene_space = None
@@ -248,23 +347,64 @@ def genetic_algorithm(
     sol_per_pop = calculate_population_size(chromosome_length)
     num_parents_mating = int(0.4 * sol_per_pop)
 
-    ga_instance = pygad.GA(
-        num_generations=num_generations,
-        on_generation=stop_at_generation,
-        num_parents_mating=num_parents_mating,
-        fitness_func=fitness_function,
-        sol_per_pop=sol_per_pop,
-        num_genes=chromosome_length,
-        gene_space=gene_space,
-        allow_duplicate_genes=False,
-        parent_selection_type=roulette_selection,
-        keep_parents=keep_parents,
-        crossover_type=crossover,
-        mutation_type=mutation_type,
-        mutation_percent_genes=mutation_percent_genes
-    )
-
-    time_start = time.time()
-    ga_instance.run()
-
-    return solution_params, all_solutions
+    # Whole population evaluated at once in batch or parallel mode
+    population_mode = batch_size is not None or workers is not None
+
+    # Pool is shut down also when GA cannot be created or run
+    pool = None
+    try:
+        if workers is not None:
+            pool = create_pool(graph, workers, cache.max_size if cache is not None else None)
+
+        fitness_function, population_fitness_function, get_best_solution = get_fitness_functions(
+            evaluator,
+            crossover_type,
+            rng,
+            all_solutions,
+            cache,
+            batch_size,
+            pool,
+            workers,
+            stats,
+            trace,
+            split_type
+        )
+
+        ga_instance = pygad.GA(
+            num_generations=num_generations,
+            **get_lap_callbacks(stats),
+            on_generation=stop_at_generation,
+            num_parents_mating=num_parents_mating,
+            fitness_func=population_fitness_function if population_mode else fitness_function,
+            fitness_batch_size=sol_per_pop if population_mode else None,
+            sol_per_pop=sol_per_pop,
+            num_genes=chromosome_length,
+            gene_space=gene_space,
+            allow_duplicate_genes=False,
+            parent_selection_type=roulette_selection,
+            keep_parents=keep_parents,
+            crossover_type=crossover,
+            mutation_type=mutation_type,
+            mutation_percent_genes=mutation_percent_genes,
+            random_seed=int(rng.numpy.integers(2 ** 32))
+        )
+
+        if cache is not None:
+            cache.start_run(split_type)
+        if stats is not None:
+            stats.start_run(evaluator, cache)
+        if trace is not None:
+            trace.start(evaluator)
+
+        time_start = time.time()
+        ga_instance.run()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if stats is not None:
+        stats.end_run(evaluator, cache)
+    if cache is not None:
+        cache.end_run()
+
+    return get_best_solution(), all_solutions
@@ -1,5 +1,9 @@
-from algorithms.Descent import descent_algorithm
-from architecture.Utils import Crossover
+from algorithms.Descent import descent_algorithm, run_descent
+from algorithms.Genetic import get_fitness_functions, get_lap_callbacks
+from architecture.Evaluator import MAX_ROUTE_LENGTH
+from architecture.Parallel import create_pool
+from architecture.Utils import Crossover, Split
+from concurrent.futures import wait
 import warnings
 import pygad
 import numpy
@@ -15,82 +19,26 @@ def hybrid_genetic_algorithm(
         time_limit,
         descent_percent,
         crossover_type,
-        neighborhood_type):
+        neighborhood_type,
+        candidates_k=None,
+        split_type=Split.GREEDY,
+        max_route_length=MAX_ROUTE_LENGTH,
+        seed=None,
+        cache=None,
+        batch_size=None,
+        workers=None,
+        stats=None,
+        trace=None):
 
     # 'Global' time counter
     time_start = 0
 
-    # Global list to store best solution
-    solution_params = (
-        [],  # solution
-        float('-inf'),  # solution_val
-        [],  # solution_routes
-        [],  # solution_vehicles
-        []  # solution_init_loads
-    )
-
     all_solutions = []
 
-    # Calculating cost of given routes
-    def calculate_cost(routes):
-        total_cost = 0
-        for route in routes:
-            for vertex in range(len(route) - 1):
-                u, v = route[vertex], route[vertex + 1]
-                total_cost += graph.get_weight(u, v)
-        return round(total_cost, 2)
-
-    # Checking if vehicle with specified capacity can serve given solution
-    def check_if_can_serve(partial_solution, chosen_vehicle):
-        discharged = sum([graph.get_vertex(vertex).discharged for vertex in partial_solution])
-        demands = [graph.get_vertex(vertex).get_vertex_demand() for vertex in partial_solution]
-        current_loads = [0] * len(demands)
-        initial_load = 0
-
-        # Check number of batteries
-        if discharged > chosen_vehicle.capacity:
-            return None
-
-        for idx, demand in enumerate(demands):
-            if demand > 0:
-                if idx == 0:
-                    current_loads[idx] = 0
-                    initial_load = demand
-                else:  # idx > 0
-                    current_load = current_loads[idx - 1] - demand
-                    if current_load > 0:
-                        current_loads[idx] = current_load
-                    else:  # current_load < 0
-                        current_loads[idx] = 0
-
-                    vertex_load = demand - current_loads[idx - 1]
-                    if vertex_load > 0:
-                        initial_load += vertex_load
-            else:  # demand < 0
-                demand = abs(demand)
-                if idx == 0:
-                    current_loads[idx] = demand
-                    initial_load = 0
-                else:  # idx > 0
-                    current_loads[idx] = current_loads[idx - 1] + demand
-
-        # Vehicle load check
-        for current_load in current_loads:
-            if current_load * 5 > chosen_vehicle.capacity - discharged:
-                return None
-
-        # Route simulating
-        vehicle_load = initial_load * 5
-        for demand in demands:
-            if vehicle_load > chosen_vehicle.capacity - discharged:
-                return None
-            vehicle_load -= demand * 5
-
-        return [initial_load, discharged]
-
-    # Creating route, adding warehouses to both ends
-    def create_route(route, warehouse):
-        return [warehouse.index] + list(route) + [warehouse.index]
+    # Shared solution evaluator
+    evaluator = graph.get_evaluator()
+    evaluator.max_route_length = max_route_length
+    rng = graph.get_rng(seed)
 
     # Calculating population size, depending on chromosome len
     def calculate_population_size(chromosome_length):
@@ -105,7 +53,7 @@ def hybrid_genetic_algorithm(
 
         probabilities = fitness / total_fitness
 
-        selected_indices = numpy.random.choice(range(len(fitness)), size=num_parents, p=probabilities)
+        selected_indices = rng.numpy.choice(range(len(fitness)), size=num_parents, p=probabilities)
         selected_parents = ga_instance.population[selected_indices]
 
         return selected_parents, selected_indices
@@ -118,7 +66,7 @@ def hybrid_genetic_algorithm(
             parent1 = parents[idx % parents.shape[0], :].copy()
             parent2 = parents[(idx + 1) % parents.shape[0], :].copy()
 
-            split_point = numpy.random.choice(range(offspring_size[1]))
+            split_point = rng.numpy.choice(range(offspring_size[1]))
 
             parent1[split_point:] = parent2[split_point:]
 
@@ -136,7 +84,7 @@ def hybrid_genetic_algorithm(
             parent1 = parents[idx % parents.shape[0], :].copy()
             parent2 = parents[(idx + 1) % parents.shape[0], :].copy()
 
-            split_points = sorted(numpy.random.choice(range(offspring_size[1]), size=2))
+            split_points = sorted(rng.numpy.choice(range(offspring_size[1]), size=2))
 
             mask = numpy.zeros(offspring_size[1], dtype=bool)
             mask[split_points[0]:split_points[1] + 1] = True
@@ -158,115 +106,108 @@ def hybrid_genetic_algorithm(
 
     # Stop algorithm by given time
     def on_generation(ga_instance):
+        if stats is not None:
+            stats.lap('fitness')
+            stats.count('generations')
+
         if time.time() - time_start >= time_limit:
             return "stop"
 
-    # Call descent_algorithm() for a given percent of GA solutions
-    def on_mutation(ga_instance, offspring_mutation):
-        num_to_modify = int(len(offspring_mutation) * descent_percent / 100)
-        selected_indices = numpy.random.choice(len(offspring_mutation), num_to_modify, replace=False)
+    # Getting vertices order of offspring
+    def get_vertices_order(offspring):
+        if crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
+            return numpy.argsort(offspring) + 1
+        elif crossover_type == Crossover.ORDER_CROSSOVER:
+            return numpy.array(offspring)
 
-        for idx in selected_indices:
-            if time.time() - time_start >= time_limit:
-                break
+    # Rearranging offspring genes to follow vertices order found by descent
+    def set_vertices_order(offspring_mutation, idx, vertices_order, desired_order):
+        if crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
+            desired_order = [x - 1 for x in desired_order]
+            vertices_order = vertices_order - 1
 
-            vertices_order = []
-            if crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
-                vertices_order = numpy.argsort(offspring_mutation[idx]) + 1
-            elif crossover_type == Crossover.ORDER_CROSSOVER:
-                vertices_order = offspring_mutation[idx]
+            rearranged_order = [0] * len(offspring_mutation[idx])
 
-            desired_order = descent_algorithm(
-                graph,
-                init_solution=vertices_order,
-                neighborhood_type=neighborhood_type
-            )
+            for new_index, target_index in enumerate(desired_order):
+                rearranged_order[target_index] = offspring_mutation[idx][vertices_order[new_index]]
 
-            if crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
-                desired_order = [x - 1 for x in desired_order]
-                vertices_order = vertices_order - 1
+            offspring_mutation[idx] = rearranged_order
 
-                rearranged_order = [0] * len(offspring_mutation[idx])
+        elif crossover_type == Crossover.ORDER_CROSSOVER:
+            offspring_mutation[idx] = desired_order
 
-                for new_index, target_index in enumerate(desired_order):
-                    rearranged_order[target_index] = offspring_mutation[idx][vertices_order[new_index]]
+    # Call descent_algorithm() for a given percent of GA solutions,
+    # with workers every offspring is improved by a separate task and descents unfinished by the deadline are dropped
+    def on_mutation(ga_instance, offspring_mutation):
+        if stats is not None:
+            stats.lap('mutation')
 
-                offspring_mutation[idx] = rearranged_order
+        descent_start = time.perf_counter()
+        apply_descents(offspring_mutation)
 
-            elif crossover_type == Crossover.ORDER_CROSSOVER:
-                offspring_mutation[idx] = desired_order
+        if stats is not None:
+            stats.add_time('descent', time.perf_counter() - descent_start)
+            stats.lap()
 
         return offspring_mutation
 
-    # Fitness function calculating solution fitness value
-    def fitness_function(ga_instance, solution, solution_id):
-        if crossover_type == Crossover.ORDER_CROSSOVER:
-            solution = [int(x) for x in solution]
-        elif crossover_type == Crossover.SINGLE_POINT_CROSSOVER:
-            solution = list(numpy.argsort(solution) + 1)
-
-        route = None
-        route_load = None
-
-        routes = []
-        vehicles = []
-        init_loads = []
-
-        solution_idx = 0
-        solution_begin = 0
-
-        closest_warehouse = graph.get_closest_warehouse(solution[solution_idx])
-        chosen_vehicle = closest_warehouse.select_vehicle()
-
-        while solution_idx < len(solution):
-            init_load = check_if_can_serve(solution[solution_begin:solution_idx+1], chosen_vehicle)
-
-            if init_load is not None:
-                if route is None:
-                    vehicles.append(chosen_vehicle.capacity)
-
-                route = solution[solution_begin:solution_idx+1]
-                route_load = init_load
-                solution_idx += 1
-            else:  # init_load == 0
-                solution_begin = solution_idx
-
-                if route is not None:
-                    routes.append(
-                        create_route(
-                            route,
-                            closest_warehouse
-                        )
-                    )
-
-                    closest_warehouse = graph.get_closest_warehouse(solution[solution_begin])
-                    init_loads.append(route_load)
-                    route = None
-                chosen_vehicle = closest_warehouse.select_vehicle()
-
-        if route:
-            routes.append(
-                create_route(
-                    route,
-                    closest_warehouse
-                )
-            )
-            init_loads.append(route_load)
-
-        fitness_value = -calculate_cost(routes)
-
-        nonlocal solution_params
-        if fitness_value > solution_params[1]:
-            solution_params = (
-                solution,
-                fitness_value,
-                routes,
-                vehicles,
-                init_loads
+    # Improving part of offspring with descent algorithm (in place)
+    def apply_descents(offspring_mutation):
+        num_to_modify = int(len(offspring_mutation) * descent_percent / 100)
+        selected_indices = rng.numpy.choice(len(offspring_mutation), num_to_modify, replace=False)
+        deadline = time_start + time_limit
+
+        if pool is not None:
+            tasks = {}
+            for idx in selected_indices:
+                vertices_order = get_vertices_order(offspring_mutation[idx])
+                descent_params = {
+                    'init_solution': vertices_order,
+                    'neighborhood_type': neighborhood_type,
+                    'candidates_k': candidates_k,
+                    'split_type': split_type,
+                    'max_route_length': max_route_length
+                }
+                future = pool.submit(run_descent, descent_params, deadline, rng.spawn(1)[0], stats is not None)
+                tasks[future] = (idx, vertices_order)
+
+            done, not_done = wait(tasks, timeout=max(deadline - time.time(), 0))
+            for future in not_done:
+                future.cancel()
+
+            # Improvements applied in selection order, independent of finishing order
+            for future, (idx, vertices_order) in tasks.items():
+                if future not in done:
+                    continue
+
+                desired_order, worker_stats = future.result()
+                if desired_order is not None:
+                    set_vertices_order(offspring_mutation, idx, vertices_order, desired_order)
+                if worker_stats is not None:
+                    stats.merge(worker_stats)
+
+            return
+
+        for idx in selected_indices:
+            if time.time() >= deadline:
+                break
+
+            vertices_order = get_vertices_order(offspring_mutation[idx])
+
+            desired_order = descent_algorithm(
+                graph,
+                init_solution=vertices_order,
+                neighborhood_type=neighborhood_type,
+                candidates_k=candidates_k,
+                split_type=split_type,
+                max_route_length=max_route_length,
+                deadline=deadline,
+                seed=rng,
+                cache=cache,
+                stats=stats
             )
-            all_solutions.append(fitness_value)
 
-        return fitness_value
+            set_vertices_order(offspring_mutation, idx, vertices_order, desired_order)
 
     # Hybrid genetic algorithm
     crossover = None
@@ -287,24 +228,68 @@ def hybrid_genetic_algorithm(
     sol_per_pop = calculate_population_size(chromosome_length)
     num_parents_mating = int(0.4 * sol_per_pop)
 
-    ga_instance = pygad.GA(
-        num_generations=num_generations,
-        on_generation=on_generation,
-        on_mutation=on_mutation,
-        num_parents_mating=num_parents_mating,
-        fitness_func=fitness_function,
-        sol_per_pop=sol_per_pop,
-        num_genes=chromosome_length,
-        gene_space=gene_space,
-        allow_duplicate_genes=False,
-        parent_selection_type=roulette_selection,
-        keep_parents=keep_parents,
-        crossover_type=crossover,
-        mutation_type=mutation_type,
-        mutation_percent_genes=mutation_percent_genes
-    )
-
-    time_start = time.time()
-    ga_instance.run()
-
-    return solution_params, all_solutions
+    # Whole population evaluated at once in batch or parallel mode
+    population_mode = batch_size is not None or workers is not None
+
+    # Pool is shut down also when GA cannot be created or run
+    pool = None
+    try:
+        if workers is not None:
+            pool = create_pool(graph, workers, cache.max_size if cache is not None else None)
+
+        fitness_function, population_fitness_function, get_best_solution = get_fitness_functions(
+            evaluator,
+            crossover_type,
+            rng,
+            all_solutions,
+            cache,
+            batch_size,
+            pool,
+            workers,
+            stats,
+            trace,
+            split_type
+        )
+
+        # Descent replaces mutation lap callback, it times mutation itself
+        ga_callbacks = get_lap_callbacks(stats)
+        ga_callbacks['on_mutation'] = on_mutation
+
+        ga_instance = pygad.GA(
+            num_generations=num_generations,
+            **ga_callbacks,
+            on_generation=on_generation,
+            num_parents_mating=num_parents_mating,
+            fitness_func=population_fitness_function if population_mode else fitness_function,
+            fitness_batch_size=sol_per_pop if population_mode else None,
+            sol_per_pop=sol_per_pop,
+            num_genes=chromosome_length,
+            gene_space=gene_space,
+            allow_duplicate_genes=False,
+            parent_selection_type=roulette_selection,
+            keep_parents=keep_parents,
+            crossover_type=crossover,
+            mutation_type=mutation_type,
+            mutation_percent_genes=mutation_percent_genes,
+            random_seed=int(rng.numpy.integers(2 ** 32))
+        )
+
+        if cache is not None:
+            cache.start_run(split_type)
+        if stats is not None:
+            stats.start_run(evaluator, cache)
+        if trace is not None:
+            trace.start(evaluator)
+
+        time_start = time.time()
+        ga_instance.run()
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    if stats is not None:
+        stats.end_run(evaluator, cache)
+    if cache is not None:
+        cache.end_run()
+
+    return get_best_solution(), all_solutions
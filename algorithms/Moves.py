@@ -0,0 +1,192 @@
+from architecture.Utils import Neighborhood, Split
+import itertools
+import numpy as np
+import random
+
+
+# Generating insert moves (i, j) of vertex at position i - vertex moved to position j
+def generate_insert_moves_from(i, n):
+    for j in range(n):
+        # Moving vertex to the previous position equals moving the previous vertex forward
+        if i != j and i != j + 1:
+            yield i, j
+
+
+# Generating moves of vertex at position i, swaps with vertices already looked at are skipped,
+# so scanning vertices one by one generates every move once
+def generate_vertex_moves(solution, i, neighborhood_type, looked):
+    if neighborhood_type == Neighborhood.INSERT:
+        return generate_insert_moves_from(i, len(solution))
+
+    if neighborhood_type == Neighborhood.SWAP:
+        return ((min(i, j), max(i, j)) for j in range(len(solution)) if j != i and not looked[solution[j]])
+
+    raise ValueError("Unknown neighborhood type.")
+
+
+# Getting position of every vertex in solution (list indexed by vertex)
+def get_positions(solution):
+    positions = [0] * (len(solution) + 1)
+    for idx, vertex in enumerate(solution):
+        positions[vertex] = idx
+    return positions
+
+
+# Getting target positions placing vertex at position i next to vertex at position p
+# (insert - right before or right after it, swap - with its predecessor or successor)
+def get_granular_targets(i, p, n, neighborhood_type):
+    if neighborhood_type == Neighborhood.INSERT:
+        # Vertices between shift back when the vertex is moved forward
+        return (p, p + 1) if p < i else (p - 1, p)
+
+    if neighborhood_type == Neighborhood.SWAP:
+        return tuple(j for j in (p - 1, p + 1) if 0 <= j < n)
+
+    raise ValueError("Unknown neighborhood type.")
+
+
+# Generating granular moves of vertex at position i - moves placing it next to one of its candidates
+# (nearest clients, see Evaluator.get_candidates()), positions - get_positions() of solution
+def generate_granular_vertex_moves(solution, i, neighborhood_type, candidates, positions):
+    n = len(solution)
+    moves = {}
+    for candidate in candidates[solution[i]]:
+        for j in get_granular_targets(i, positions[candidate], n, neighborhood_type):
+            if j != i:
+                move = (i, j) if neighborhood_type == Neighborhood.INSERT else (min(i, j), max(i, j))
+                moves[move] = None
+
+    return iter(moves)
+
+
+# Getting number of moves of given neighborhood type for solution of given length
+# (granular neighborhood - every vertex placed next to each of its k candidates, before or after it)
+def get_neighborhood_size(n, neighborhood_type, candidates_k=None):
+    if candidates_k is not None:
+        return n * min(candidates_k, n - 1) * 2
+
+    if neighborhood_type == Neighborhood.INSERT:
+        return (n - 1) ** 2
+
+    if neighborhood_type == Neighborhood.SWAP:
+        return n * (n - 1) // 2
+
+    raise ValueError("Unknown neighborhood type.")
+
+
+# Drawing uniformly random move of given neighborhood type for solution of given length
+def generate_random_move(n, neighborhood_type, rng=random):
+    if neighborhood_type == Neighborhood.INSERT:
+        while True:
+            i, j = rng.randrange(n), rng.randrange(n)
+            if i != j and i != j + 1:
+                return i, j
+
+    if neighborhood_type == Neighborhood.SWAP:
+        i, j = rng.sample(range(n), 2)
+        return min(i, j), max(i, j)
+
+    raise ValueError("Unknown neighborhood type.")
+
+
+# Drawing random granular move (see generate_granular_vertex_moves()) - random vertex placed next to
+# random candidate
+def generate_random_granular_move(solution, neighborhood_type, candidates, positions, rng=random):
+    n = len(solution)
+    while True:
+        i = rng.randrange(n)
+        targets = get_granular_targets(i, positions[rng.choice(candidates[solution[i]])], n, neighborhood_type)
+        j = targets[rng.randrange(len(targets))]
+        if j != i:
+            return (i, j) if neighborhood_type == Neighborhood.INSERT else (min(i, j), max(i, j))
+
+
+# Applying move to solution in place
+def apply_move(solution, move, neighborhood_type):
+    i, j = move
+    if neighborhood_type == Neighborhood.INSERT:
+        solution.insert(j, solution.pop(i))
+    else:  # Neighborhood.SWAP
+        solution[i], solution[j] = solution[j], solution[i]
+
+
+# Reverting move applied to solution in place
+def undo_move(solution, move, neighborhood_type):
+    i, j = move
+    if neighborhood_type == Neighborhood.INSERT:
+        solution.insert(i, solution.pop(j))
+    else:  # Neighborhood.SWAP
+        solution[i], solution[j] = solution[j], solution[i]
+
+
+# Evaluating move without copying solution - move is applied in place, evaluated
+# from its first changed position (base Solution split states) and reverted, returns neighbor Solution
+def evaluate_move(evaluator,
+                  solution,
+                  move,
+                  neighborhood_type,
+                  base_solution,
+                  base_states,
+                  rng=None,
+                  cache=None,
+                  split_type=Split.GREEDY):
+
+    apply_move(solution, move, neighborhood_type)
+    neighbor = evaluator.fitness_function_from(solution, min(move), base_solution, base_states, rng, cache, split_type,
+                                               (neighborhood_type, move))
+    undo_move(solution, move, neighborhood_type)
+    return neighbor
+
+
+# Evaluating moves one by one, yields moves with neighbor costs and Solutions
+def evaluate_moves(evaluator,
+                   solution,
+                   moves,
+                   neighborhood_type,
+                   base_solution,
+                   base_states,
+                   rng=None,
+                   cache=None,
+                   split_type=Split.GREEDY):
+
+    for move in moves:
+        neighbor = evaluate_move(
+            evaluator,
+            solution,
+            move,
+            neighborhood_type,
+            base_solution,
+            base_states,
+            rng,
+            cache,
+            split_type
+        )
+        yield move, neighbor.cost, neighbor
+
+
+# Getting neighbors created by moves as 2-D array (neighbor per row), solution is left unchanged
+def get_neighbors_array(solution, moves, neighborhood_type):
+    moves = np.asarray(moves, dtype=np.int64).reshape(-1, 2)
+    i, j = moves[:, :1], moves[:, 1:]
+    positions = np.arange(len(solution))[None, :]
+
+    # Position in solution of every neighbor vertex
+    if neighborhood_type == Neighborhood.INSERT:
+        source = positions + ((positions >= i) & (positions < j)) - ((positions > j) & (positions <= i))
+        source = np.where(positions == j, i, source)
+    else:  # Neighborhood.SWAP
+        source = np.where(positions == i, j, np.where(positions == j, i, positions))
+
+    return np.asarray(solution, dtype=np.int64)[source]
+
+
+# Evaluating moves in NumPy batches of given size, yields moves with neighbor costs and batch rows
+# (neighbor, route begins, vehicle capacities) recovering neighbor Solution with Evaluator.get_solution()
+def evaluate_moves_batch(evaluator, solution, moves, neighborhood_type, batch_size, rng=None, split_type=Split.GREEDY):
+    moves = iter(moves)
+    while batch_moves := list(itertools.islice(moves, batch_size)):
+        neighbors = get_neighbors_array(solution, batch_moves, neighborhood_type)
+        costs, route_begins, capacities = evaluator.fitness_function_batch(neighbors, rng, split_type)
+
+        for row, (move, cost) in enumerate(zip(batch_moves, costs.tolist())):
+            yield move, cost, (neighbors[row], route_begins[row], capacities[row])
@@ -1,28 +1,131 @@
-from algorithms.Descent import descent_algorithm
+from algorithms.Descent import descent_algorithm, run_descent
+from architecture.Evaluator import MAX_ROUTE_LENGTH
+from architecture.Parallel import create_pool
+from architecture.Utils import Improvement, Split
+from concurrent.futures import FIRST_COMPLETED, wait
 import time
 
 
 # Multistart descent algorithm
-def multistart_descent(graph, num_iterations, time_limit, neighborhood_type):
+# candidates_k - granular neighborhood of k nearest clients (see descent_algorithm())
+# route_improvement - 2-opt and Or-opt improvement of routes at descent local optima (see descent_algorithm())
+# split_type - splitting solutions into routes
+# max_route_length - longest route of optimal split in clients (None - not limited)
+# cache - FitnessCache of Split.OPTIMAL solutions, cleared for every restart (serial and parallel runs alike)
+# workers - number of processes running restarts in parallel (serial run by default),
+#           every worker keeps own cache of the given cache size
+# stats - Stats filled with run counters and phase times (merged from workers)
+# trace - Trace streaming best cost improvements as restarts finish, instead of collecting them in all_solutions
+def multistart_descent(graph,
+                       num_iterations,
+                       time_limit,
+                       neighborhood_type,
+                       local_optimum=True,
+                       improvement_type=Improvement.BEST_IMPROVEMENT,
+                       dont_look_bits=False,
+                       candidates_k=None,
+                       route_improvement=False,
+                       split_type=Split.GREEDY,
+                       max_route_length=MAX_ROUTE_LENGTH,
+                       seed=None,
+                       cache=None,
+                       workers=None,
+                       stats=None,
+                       trace=None):
 
     all_solutions = []
     best_descent_instance = None
     min_value = float('inf')
 
+    descent_params = {
+        'neighborhood_type': neighborhood_type,
+        'local_optimum': local_optimum,
+        'improvement_type': improvement_type,
+        'dont_look_bits': dont_look_bits,
+        'candidates_k': candidates_k,
+        'route_improvement': route_improvement,
+        'split_type': split_type,
+        'max_route_length': max_route_length
+    }
+
+    # Independent random generator of every restart, spawned in restarts order
+    rng = graph.get_rng(seed)
+
+    if cache is not None:
+        cache.start_run(split_type)
+    if stats is not None:
+        stats.start_run(graph.get_evaluator(), cache)
+    if trace is not None:
+        trace.start(graph.get_evaluator())
+
     start_time = time.time()
-    for i in range(num_iterations):
-        if time.time() - start_time >= time_limit:
-            break
+    deadline = start_time + time_limit
+    descent_instances = {}
+
+    if workers is None:
+        for i in range(num_iterations):
+            if time.time() - start_time >= time_limit:
+                break
+
+            # Restart does not depend on restarts before it, as in worker processes
+            if cache is not None:
+                cache.clear()
+
+            descent_instances[i] = descent_algorithm(
+                graph,
+                deadline=deadline,
+                seed=rng.spawn(1)[0],
+                cache=cache,
+                stats=stats,
+                **descent_params
+            )
+            if trace is not None:
+                trace.record(descent_instances[i].cost)
+    else:
+        cache_size = cache.max_size if cache is not None else None
+        with create_pool(graph, workers, cache_size) as pool:
+            # Limited number of queued restarts, new ones are submitted as others finish
+            pending = {}
+            worker_stats = {}
+            next_restart = 0
+            while True:
+                while next_restart < num_iterations and len(pending) < 2 * workers and time.time() < deadline:
+                    future = pool.submit(run_descent, descent_params, deadline, rng.spawn(1)[0], stats is not None)
+                    pending[future] = next_restart
+                    next_restart += 1
 
-        descent_instance = descent_algorithm(
-            graph,
-            neighborhood_type=neighborhood_type
-        )
-        current_value = descent_instance[1]
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    restart = pending.pop(future)
+                    descent_instances[restart], worker_stats[restart] = future.result()
+                    if trace is not None and descent_instances[restart] is not None:
+                        trace.record(descent_instances[restart].cost)
+
+            for restart in sorted(worker_stats):
+                if worker_stats[restart] is not None:
+                    stats.merge(worker_stats[restart])
+
+    for i in sorted(descent_instances):
+        descent_instance = descent_instances[i]
+        if descent_instance is None:
+            continue
+
+        if stats is not None:
+            stats.count('restarts')
+        current_value = descent_instance.cost
 
         if current_value < min_value:
             min_value = current_value
             best_descent_instance = descent_instance
-            all_solutions.append(current_value)
+            if trace is None:
+                all_solutions.append(current_value)
+
+    if stats is not None:
+        stats.end_run(graph.get_evaluator(), cache)
+    if cache is not None:
+        cache.end_run()
 
     return best_descent_instance, all_solutions
@@ -0,0 +1,245 @@
+from architecture.Solution import Solution
+import architecture.Parallel as Parallel
+import time
+
+# Smallest cost change counted as improvement (float sums of the same edges may differ in last bits)
+MIN_GAIN = 1e-9
+
+# Longest client segment moved by Or-opt
+MAX_SEGMENT_LENGTH = 3
+
+
+# Getting prefix loads of route clients: demands prefix sums (index 0 - empty route), their running
+# maxima and minima from the route begin and from every position to the route end
+def get_prefix_loads(evaluator, clients):
+    demands = evaluator.demands_list
+
+    prefix_sums = [0]
+    for vertex in clients:
+        prefix_sums.append(prefix_sums[-1] + demands[vertex])
+
+    prefix_max = prefix_sums[:]
+    prefix_min = prefix_sums[:]
+    for idx in range(1, len(prefix_sums)):
+        prefix_max[idx] = max(prefix_max[idx - 1], prefix_sums[idx])
+        prefix_min[idx] = min(prefix_min[idx - 1], prefix_sums[idx])
+
+    suffix_max = prefix_sums[:]
+    suffix_min = prefix_sums[:]
+    for idx in range(len(prefix_sums) - 2, -1, -1):
+        suffix_max[idx] = max(suffix_max[idx + 1], prefix_sums[idx])
+        suffix_min[idx] = min(suffix_min[idx + 1], prefix_sums[idx])
+
+    return prefix_sums, prefix_max, prefix_min, suffix_max, suffix_min
+
+
+# Finding first improving 2-opt move of route (route - clients with warehouse at both ends),
+# reversing route[begin:end + 1] - returns (begin, end) or None
+# Gain is read from edges at the segment ends, reversed segment cost difference is carried along
+# (zero on symmetric distances); loads of the reversed segment are its mirrored prefix sums
+def find_two_opt_move(evaluator, route, max_span, prefix_loads):
+    distances = evaluator.distances_list
+    prefix_sums, prefix_max, prefix_min, suffix_max, suffix_min = prefix_loads
+    num_clients = len(route) - 2
+
+    checks = 0
+    move = None
+    for begin in range(1, num_clients):
+        before = route[begin - 1]
+        removed_begin = distances[before][route[begin]]
+        segment_max = prefix_sums[begin - 1]
+        segment_min = prefix_sums[begin - 1]
+        reversal_delta = 0.0
+
+        for end in range(begin + 1, num_clients + 1):
+            previous = route[end - 1]
+            vertex = route[end]
+            after = route[end + 1]
+            reversal_delta += distances[vertex][previous] - distances[previous][vertex]
+            if prefix_sums[end - 1] > segment_max:
+                segment_max = prefix_sums[end - 1]
+            elif prefix_sums[end - 1] < segment_min:
+                segment_min = prefix_sums[end - 1]
+
+            delta = distances[before][vertex] + distances[route[begin]][after] \
+                - removed_begin - distances[vertex][after] + reversal_delta
+            if delta > -MIN_GAIN:
+                continue
+
+            # Reversed segment prefix sums are prefix_sums[begin - 1] + prefix_sums[end] - prefix_sums[i],
+            # i in [begin - 1, end - 1]
+            checks += 1
+            offset = prefix_sums[begin - 1] + prefix_sums[end]
+            max_load = max(prefix_max[begin - 1], suffix_max[end], offset - segment_min)
+            min_load = min(prefix_min[begin - 1], suffix_min[end], offset - segment_max)
+            if (max_load - min_load) * 5 <= max_span:
+                move = (begin, end)
+                break
+
+        if move is not None:
+            break
+
+    evaluator.num_feasibility_checks += checks
+    return move
+
+
+# Finding first improving Or-opt move of route, moving segment route[begin:begin + length] (up to
+# MAX_SEGMENT_LENGTH clients) after route position target - returns (begin, length, target) or None
+# Moved segment shifts prefix sums of clients it passes by its demands sum, their extremes are carried along
+def find_or_opt_move(evaluator, route, max_span, prefix_loads):
+    distances = evaluator.distances_list
+    prefix_sums, prefix_max, prefix_min, suffix_max, suffix_min = prefix_loads
+    num_clients = len(route) - 2
+
+    checks = 0
+    for length in range(1, min(MAX_SEGMENT_LENGTH, num_clients - 1) + 1):
+        for begin in range(1, num_clients - length + 2):
+            end = begin + length - 1
+            first = route[begin]
+            last = route[end]
+            removal_delta = distances[route[begin - 1]][route[end + 1]] \
+                - distances[route[begin - 1]][first] - distances[last][route[end + 1]]
+
+            # Segment demands sum and extremes of its own prefix sums
+            segment_sum = prefix_sums[end] - prefix_sums[begin - 1]
+            segment_max = max(prefix_sums[begin:end + 1]) - prefix_sums[begin - 1]
+            segment_min = min(prefix_sums[begin:end + 1]) - prefix_sums[begin - 1]
+
+            # Forward - segment follows clients route[end + 1:target + 1]
+            passed_max = float('-inf')
+            passed_min = float('inf')
+            for target in range(end + 1, num_clients + 1):
+                passed_max = max(passed_max, prefix_sums[target])
+                passed_min = min(passed_min, prefix_sums[target])
+
+                delta = removal_delta + distances[route[target]][first] + distances[last][route[target + 1]] \
+                    - distances[route[target]][route[target + 1]]
+                if delta > -MIN_GAIN:
+                    continue
+
+                checks += 1
+                segment_base = prefix_sums[target] - segment_sum
+                max_load = max(prefix_max[begin - 1], suffix_max[target], passed_max - segment_sum,
+                               segment_base + segment_max)
+                min_load = min(prefix_min[begin - 1], suffix_min[target], passed_min - segment_sum,
+                               segment_base + segment_min)
+                if (max_load - min_load) * 5 <= max_span:
+                    evaluator.num_feasibility_checks += checks
+                    return begin, length, target
+
+            # Backward - segment precedes clients route[target + 1:begin]
+            passed_max = float('-inf')
+            passed_min = float('inf')
+            for target in range(begin - 2, -1, -1):
+                passed_max = max(passed_max, prefix_sums[target + 1])
+                passed_min = min(passed_min, prefix_sums[target + 1])
+
+                delta = removal_delta + distances[route[target]][first] + distances[last][route[target + 1]] \
+                    - distances[route[target]][route[target + 1]]
+                if delta > -MIN_GAIN:
+                    continue
+
+                checks += 1
+                max_load = max(prefix_max[target], suffix_max[end], passed_max + segment_sum,
+                               prefix_sums[target] + segment_max)
+                min_load = min(prefix_min[target], suffix_min[end], passed_min + segment_sum,
+                               prefix_sums[target] + segment_min)
+                if (max_load - min_load) * 5 <= max_span:
+                    evaluator.num_feasibility_checks += checks
+                    return begin, length, target
+
+    evaluator.num_feasibility_checks += checks
+    return None
+
+
+# Improving route with 2-opt and Or-opt moves until neither improves it (first improvement)
+# route - clients with warehouse at both ends, served by vehicle of given capacity
+# Returns improved route and number of applied moves
+def improve_route(evaluator, route, capacity):
+    discharged_list = evaluator.discharged_list
+
+    # Batteries load does not depend on clients order
+    route = list(route)
+    max_span = capacity - sum(discharged_list[vertex] for vertex in route[1:-1])
+
+    num_moves = 0
+    while len(route) > 3:
+        prefix_loads = get_prefix_loads(evaluator, route[1:-1])
+
+        move = find_two_opt_move(evaluator, route, max_span, prefix_loads)
+        if move is not None:
+            begin, end = move
+            route[begin:end + 1] = route[end:begin - 1:-1]
+            num_moves += 1
+            continue
+
+        move = find_or_opt_move(evaluator, route, max_span, prefix_loads)
+        if move is not None:
+            begin, length, target = move
+            segment = route[begin:begin + length]
+            if target > begin:
+                route[begin:target + 1] = route[begin + length:target + 1] + segment
+            else:
+                route[target + 1:begin + length] = segment + route[target + 1:begin]
+            num_moves += 1
+            continue
+
+        break
+
+    return route, num_moves
+
+
+# Improving routes in worker process (see Parallel.create_pool()), returns improve_route() results
+def improve_routes_worker(routes, capacities):
+    evaluator = Parallel.worker_graph.get_evaluator()
+    return [improve_route(evaluator, route, capacity) for route, capacity in zip(routes, capacities)]
+
+
+# Route improvement - every route of Solution is improved with 2-opt and Or-opt moves, keeping its warehouse
+# and vehicle, returns Solution with routes improved (giant tour follows new clients order)
+# Usable on result of any algorithm, routes are independent, so they can be improved by process pool
+# pool - process pool improving routes split into workers chunks (one per worker),
+#        routes are improved in this process without pool or workers
+# stats - Stats filled with applied moves and route improvement time
+def improve_routes(graph, solution, pool=None, workers=None, stats=None):
+    evaluator = graph.get_evaluator()
+    start_time = time.perf_counter()
+
+    routes = solution.get_routes()
+    capacities = solution.get_vehicles()
+    if pool is not None and workers is not None:
+        chunk_size = -(-len(routes) // workers)
+        chunk_begins = range(0, len(routes), chunk_size)
+        results = []
+        for chunk_results in pool.map(
+            improve_routes_worker,
+            [routes[begin:begin + chunk_size] for begin in chunk_begins],
+            [capacities[begin:begin + chunk_size] for begin in chunk_begins]
+        ):
+            results.extend(chunk_results)
+    else:
+        results = [improve_route(evaluator, route, capacity) for route, capacity in zip(routes, capacities)]
+
+    tour = []
+    loads = []
+    num_moves = 0
+    for route, route_moves in results:
+        max_demands_sum, discharged, _ = evaluator.get_route_loads(route, 1, len(route) - 1)
+        tour.extend(route[1:-1])
+        loads.append(max_demands_sum)
+        loads.append(discharged)
+        num_moves += route_moves
+
+    improved = solution
+    if num_moves > 0:
+        cost = evaluator.calculate_cost([route for route, _ in results])
+        improved = Solution.from_lists(tour, cost, solution.route_offsets, solution.depots, capacities, loads)
+
+        # Routes are not split again, only improvement of the best cost is recorded
+        evaluator.count_evaluations(0, cost)
+
+    if stats is not None:
+        stats.count('route_moves', num_moves)
+        stats.add_time('route_improvement', time.perf_counter() - start_time)
+
+    return improved
@@ -1,206 +1,168 @@
+from algorithms.Moves import apply_move, evaluate_move, evaluate_moves_batch, generate_random_move, \
+    generate_random_granular_move, get_neighborhood_size, get_positions
+from architecture.Evaluator import MAX_ROUTE_LENGTH
+from architecture.Utils import Split
 import time
 import random
 import math
 
 
-# Generating insert neighborhood
-def generate_insert_neighborhood(solution):  # size: (n - 1)^2
-    neighborhood = []
-    n = len(solution)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                neighbor = list(solution)
-                neighbor.insert(j, neighbor.pop(i))
-                neighborhood.append(neighbor)
-    return list(set(tuple(neighbor) for neighbor in neighborhood))
-
-
-# Generating swap neighborhood
-def generate_swap_neighborhood(solution):  # size: n(n - 1)/2
-    neighborhood = []
-    n = len(solution)
-    for i in range(n):
-        for j in range(n):
-            if i != j:
-                neighbor = list(solution)
-                neighbor[i], neighbor[j] = neighbor[j], neighbor[i]
-                neighborhood.append(neighbor)
-    return list(set(tuple(neighbor) for neighbor in neighborhood))
-
-
 # Accepting result with given probability
-def accept_with_probability(probability):
-    return random.random() < probability
-
-
-# Simulated annealing
-def simulated_annealing(graph, num_iterations, time_limit, initial_temperature, final_temperature, neighborhood_type):
-
-    # Calculating cost of given routes
-    def calculate_cost(routes):
-        total_cost = 0
-        for route in routes:
-            for vertex in range(len(route) - 1):
-                u, v = route[vertex], route[vertex + 1]
-                total_cost += graph.get_weight(u, v)
-        return round(total_cost, 2)
-
-    # Checking if vehicle with specified capacity can serve given solution
-    def check_if_can_serve(partial_solution, chosen_vehicle):
-        discharged = sum([graph.get_vertex(vertex).discharged for vertex in partial_solution])
-        demands = [graph.get_vertex(vertex).get_vertex_demand() for vertex in partial_solution]
-        current_loads = [0] * len(demands)
-        initial_load = 0
-
-        # Check number of batteries
-        if discharged > chosen_vehicle.capacity:
-            return None
-
-        for idx, demand in enumerate(demands):
-            if demand > 0:
-                if idx == 0:
-                    current_loads[idx] = 0
-                    initial_load = demand
-                else:  # idx > 0
-                    current_load = current_loads[idx - 1] - demand
-                    if current_load > 0:
-                        current_loads[idx] = current_load
-                    else:  # current_load < 0
-                        current_loads[idx] = 0
-
-                    vertex_load = demand - current_loads[idx - 1]
-                    if vertex_load > 0:
-                        initial_load += vertex_load
-            else:  # demand < 0
-                demand = abs(demand)
-                if idx == 0:
-                    current_loads[idx] = demand
-                    initial_load = 0
-                else:  # idx > 0
-                    current_loads[idx] = current_loads[idx - 1] + demand
-
-        # Vehicle load check
-        for current_load in current_loads:
-            if current_load * 5 > chosen_vehicle.capacity - discharged:
-                return None
-
-        # Route simulating
-        vehicle_load = initial_load * 5
-        for demand in demands:
-            if vehicle_load > chosen_vehicle.capacity - discharged:
-                return None
-            vehicle_load -= demand * 5
-
-        return [initial_load, discharged]
-
-    # Creating route, adding warehouses to both ends
-    def create_route(route, warehouse):
-        return [warehouse.index] + list(route) + [warehouse.index]
-
-    # Fitness function calculating solution fitness value
-    def fitness_function(solution):
-        route = None
-        route_load = None
-
-        routes = []
-        vehicles = []
-        init_loads = []
-
-        solution_idx = 0
-        solution_begin = 0
-
-        closest_warehouse = graph.get_closest_warehouse(solution[solution_idx])
-        chosen_vehicle = closest_warehouse.select_vehicle()
-
-        while solution_idx < len(solution):
-            init_load = check_if_can_serve(solution[solution_begin:solution_idx + 1], chosen_vehicle)
-
-            if init_load is not None:
-                if route is None:
-                    vehicles.append(chosen_vehicle.capacity)
-
-                route = solution[solution_begin:solution_idx + 1]
-                route_load = init_load
-                solution_idx += 1
-            else:  # init_load == 0
-                solution_begin = solution_idx
-
-                if route is not None:
-                    routes.append(
-                        create_route(
-                            route,
-                            closest_warehouse
-                        )
-                    )
-
-                    closest_warehouse = graph.get_closest_warehouse(solution[solution_begin])
-                    init_loads.append(route_load)
-                    route = None
-                chosen_vehicle = closest_warehouse.select_vehicle()
-
-        if route:
-            routes.append(
-                create_route(
-                    route,
-                    closest_warehouse
-                )
-            )
-            init_loads.append(route_load)
-
-        return calculate_cost(routes), routes, vehicles, init_loads
+def accept_with_probability(probability, rng=random):
+    return rng.random() < probability
+
+
+# Simulated annealing - Metropolis sampling of single random moves
+# moves_per_temperature - number of moves drawn at every temperature, neighborhood size by default
+# split_time_limit - every temperature also ends once its share of time_limit is used (time left unused by earlier
+#                    temperatures passes on to the later ones), moves drawn then depend on machine speed, so the same
+#                    seed does not reproduce the run - off by default, only time_limit stops the run
+# candidates_k - granular neighborhood, moves place vertex next to one of its k nearest clients (all moves by default)
+# split_type - splitting solutions into routes (Split.OPTIMAL is not supported by batch evaluation)
+# max_route_length - longest route of optimal split in clients (None - not limited)
+# batch_size - draw and evaluate moves in NumPy batches of given size, batch is dropped after the first accepted move
+# stats - Stats filled with run counters and phase times
+# trace - Trace streaming best cost improvements instead of collecting them in all_solutions
+def simulated_annealing(graph,
+                        num_iterations,
+                        time_limit,
+                        initial_temperature,
+                        final_temperature,
+                        neighborhood_type,
+                        moves_per_temperature=None,
+                        split_time_limit=False,
+                        candidates_k=None,
+                        split_type=Split.GREEDY,
+                        max_route_length=MAX_ROUTE_LENGTH,
+                        batch_size=None,
+                        seed=None,
+                        cache=None,
+                        stats=None,
+                        trace=None):
+
+    # Shared solution evaluator
+    evaluator = graph.get_evaluator()
+    evaluator.max_route_length = max_route_length
+    rng = graph.get_rng(seed)
+
+    if cache is not None:
+        cache.start_run(split_type)
+    if stats is not None:
+        stats.start_run(evaluator, cache)
+    if trace is not None:
+        trace.start(evaluator)
 
     # Simulated annealing algorithm
     beta = (initial_temperature - final_temperature) / ((num_iterations - 1) * initial_temperature * final_temperature)
-    solution = graph.get_vertices_permutation()
+    solution = graph.get_vertices_permutation(rng)
     current_temperature = initial_temperature
-    best_solution_params = (
-        [],
-        float('inf'),
-        [],
-        [],
-        []
-    )
+
+    if moves_per_temperature is None:
+        moves_per_temperature = get_neighborhood_size(len(solution), neighborhood_type, candidates_k)
+
+    solution_params = evaluator.fitness_function(solution, rng, cache, split_type)
+
+    # Neighbors are evaluated from their first changed position only
+    solution_states = evaluator.get_split_states(solution_params, split_type)
+
+    candidates = evaluator.get_candidates(candidates_k) if candidates_k is not None else None
+    positions = get_positions(solution) if candidates is not None else None
+
+    # Drawing random move of current solution
+    def draw_move():
+        if candidates is None:
+            return generate_random_move(len(solution), neighborhood_type, rng.random)
+        return generate_random_granular_move(solution, neighborhood_type, candidates, positions, rng.random)
+
+    # Solutions are not changed once evaluated, the best one is kept without copying
+    best_solution_params = solution_params
     all_solutions = []
+    if trace is not None:
+        trace.record(solution_params.cost)
+    else:
+        all_solutions.append(solution_params.cost)
 
     start_time = time.time()
+    deadline = start_time + time_limit
     for i in range(num_iterations):
-        if time.time() - start_time >= time_limit:
+        if time.time() >= deadline:
             break
 
-        neighborhood = []
-        if neighborhood_type == neighborhood_type:
-            neighborhood = generate_insert_neighborhood(solution)
-
-        if neighborhood_type == neighborhood_type:
-            neighborhood = generate_swap_neighborhood(solution)
-
-        solution_val, solution_routes, solution_vehicles, solution_init_loads = fitness_function(solution)
-        solution_params = (
-            solution,
-            solution_val,
-            solution_routes,
-            solution_vehicles,
-            solution_init_loads
-        )
-
-        for neighbor in neighborhood:
-            neighbor_val, neighbor_routes, neighbor_vehicles, neighbor_init_loads = fitness_function(neighbor)
-            probability = math.exp((solution_params[1] - neighbor_val) / current_temperature)
-
-            if accept_with_probability(probability):
-                solution_params = (
-                    neighbor,
-                    neighbor_val,
-                    neighbor_routes,
-                    neighbor_vehicles,
-                    neighbor_init_loads
+        if stats is not None:
+            stats.count('temperatures')
+
+        temperature_deadline = start_time + time_limit * (i + 1) / num_iterations if split_time_limit else deadline
+        moves_done = 0
+        while moves_done < moves_per_temperature and time.time() < temperature_deadline:
+            if stats is not None:
+                evaluation_time = time.perf_counter()
+
+            if batch_size is None:
+                move = draw_move()
+                neighbor_params = evaluate_move(
+                    evaluator,
+                    solution,
+                    move,
+                    neighborhood_type,
+                    solution_params,
+                    solution_states,
+                    rng,
+                    cache,
+                    split_type
+                )
+                evaluated_moves = [(move, neighbor_params.cost, neighbor_params)]
+            else:
+                moves = [draw_move() for _ in range(min(batch_size, moves_per_temperature - moves_done))]
+                evaluated_moves = list(
+                    evaluate_moves_batch(evaluator, solution, moves, neighborhood_type, batch_size, rng, split_type)
                 )
-                all_solutions.append(neighbor_val)
 
-        if best_solution_params[1] > solution_params[1]:
-            best_solution_params = solution_params
+            if stats is not None:
+                stats.add_time('neighborhood_evaluation', time.perf_counter() - evaluation_time)
+
+            for move, neighbor_val, neighbor_params in evaluated_moves:
+                moves_done += 1
+                if stats is not None:
+                    stats.count('moves')
+
+                # Improving moves are always accepted, worsening ones with probability exp(-delta / temperature)
+                delta = neighbor_val - solution_params.cost
+                if delta > 0 and not accept_with_probability(math.exp(-delta / current_temperature), rng.random):
+                    continue
+
+                # Batch evaluation gives costs only, neighbor routes are recovered from its batch row
+                if batch_size is not None:
+                    neighbor_params = evaluator.get_solution(*neighbor_params)
+
+                if stats is not None:
+                    build_time = time.perf_counter()
+
+                apply_move(solution, move, neighborhood_type)
+                solution_params = neighbor_params
+                solution_states = evaluator.get_split_states(solution_params, split_type)
+                if candidates is not None:
+                    positions = get_positions(solution)
+
+                if stats is not None:
+                    stats.add_time('neighborhood_build', time.perf_counter() - build_time)
+                    stats.count('accepted_moves')
+
+                if best_solution_params.cost > solution_params.cost:
+                    best_solution_params = solution_params
+                    if trace is not None:
+                        trace.record(solution_params.cost)
+                    else:
+                        all_solutions.append(solution_params.cost)
+
+                # Remaining batch neighbors were created from the previous solution
+                break
 
         if i < num_iterations - 1:
             current_temperature = current_temperature / (1 + beta * current_temperature)
+
+    if stats is not None:
+        stats.end_run(evaluator, cache)
+    if cache is not None:
+        cache.end_run()
+
     return best_solution_params, all_solutions
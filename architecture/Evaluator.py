@@ -0,0 +1,625 @@
+from architecture.Solution import Solution
+from architecture.Utils import Split
+from bisect import bisect_left
+from operator import add
+from array import array
+import numpy as np
+import time
+
+# Largest distance matrix kept as Python lists of all its rows (faster lookups),
+# rows of larger matrices are decoded on first use (see DistanceRows)
+MAX_LIST_CELLS = 2 ** 22
+
+# Default longest route of optimal split (clients), algorithms set it for their run (None - not limited)
+MAX_ROUTE_LENGTH = 50
+
+
+class DistanceRows(dict):
+
+    # DistanceRows class constructor - distance rows indexed as Evaluator.distances_list rows,
+    # every row is decoded on first lookup into a typed array of matrix storage size
+    def __init__(self, evaluator):
+        super().__init__()
+        self.evaluator = evaluator
+
+    def __missing__(self, vertex):
+        row = self.evaluator.get_distance_row(vertex).astype(self.evaluator.row_dtype)
+        self[vertex] = array(self.evaluator.row_dtype.char, row.tobytes())
+        return self[vertex]
+
+
+class Evaluator:
+
+    # Evaluator class constructor (built once per graph, see Graph.get_evaluator())
+    def __init__(self, graph):
+        self.graph = graph
+        self.num_vertices = graph.num_vertices
+        self.num_warehouses = graph.num_warehouses
+
+        # Distances are read from graph adjacency matrix in its storage type (memory-mapped binary instances
+        # are not copied), vertex index is shifted by offset to matrix index (warehouses are stored first)
+        self.offset = graph.num_warehouses - 1
+        self.adj_matrix = graph.adj_matrix
+        self.check_edges()
+
+        # Other arrays are indexed directly by vertex index - negative warehouse indices wrap around
+        # to the last rows/columns, rolled_vertices are vertex indices in that order
+        self.rolled_vertices = np.roll(np.arange(-self.offset, self.num_vertices - self.offset), -self.offset)
+
+        self.demands = np.zeros(self.num_vertices, dtype=np.int64)
+        self.discharged = np.zeros(self.num_vertices, dtype=np.int64)
+        for vertex in graph.list_client_vertices:
+            self.demands[vertex.index] = vertex.get_vertex_demand()
+            self.discharged[vertex.index] = vertex.discharged
+
+        # Closest warehouse index of every vertex (precomputed by graph for client vertices)
+        self.closest_warehouses = np.zeros(self.num_vertices, dtype=np.int64)
+        self.closest_warehouses[1:len(graph.closest_warehouses) + 1] = graph.closest_warehouses
+
+        # Warehouse vehicle capacities and cumulative selection probabilities (proportional to capacity)
+        max_vehicles = max(len(warehouse.list_vehicles) for warehouse in graph.list_warehouse_vertices)
+        self.vehicle_capacities = np.zeros((self.num_vertices, max_vehicles), dtype=np.int64)
+        self.vehicle_probabilities = np.ones((self.num_vertices, max_vehicles))
+        for warehouse in graph.list_warehouse_vertices:
+            capacities = [vehicle.capacity for vehicle in warehouse.list_vehicles]
+            probabilities = np.cumsum(capacities) / sum(capacities)
+            probabilities[-1] = 1.0
+            self.vehicle_capacities[warehouse.index, :len(capacities)] = capacities
+            self.vehicle_probabilities[warehouse.index, :len(capacities)] = probabilities
+
+        # Raw Python lists for scalar lookups in the inner loops, distances of large instances
+        # are decoded row by row into typed arrays (float32 storage is kept, others are decoded into float64)
+        self.row_dtype = np.dtype(np.float32 if graph.distance_scale is None and self.adj_matrix.dtype == np.float32
+                                  else np.float64)
+        if self.num_vertices ** 2 <= MAX_LIST_CELLS:
+            self.distances_list = [self.get_distance_row(vertex).tolist() for vertex in self.rolled_vertices.tolist()]
+        else:
+            self.distances_list = DistanceRows(self)
+        self.demands_list = self.demands.tolist()
+        self.discharged_list = self.discharged.tolist()
+        self.closest_warehouses_list = self.closest_warehouses.tolist()
+        self.closest_warehouse_vertices = [None] + [
+            graph.get_closest_warehouse(vertex) for vertex in range(1, len(graph.closest_warehouses) + 1)
+        ]
+
+        # Optimal split - vehicle capacities of every warehouse in ascending order, routes are limited
+        # to capacity available at every warehouse and to max_route_length clients (see MAX_ROUTE_LENGTH)
+        self.sorted_capacities = [
+            sorted(vehicle.capacity for vehicle in warehouse.list_vehicles) for warehouse in graph.list_warehouse_vertices
+        ]
+        self.max_capacity = min(capacities[-1] for capacities in self.sorted_capacities)
+        self.max_route_length = MAX_ROUTE_LENGTH
+
+        # Optimal split - distances from every warehouse to vertex and back (built on first use)
+        self.depot_distances = None
+
+        # Granular neighborhoods - k nearest clients of every client, by k (built on first use)
+        self.candidates = {}
+
+        self.reset_counters()
+
+    # Checking that graph is complete, matrix is read in row blocks
+    def check_edges(self):
+        rows_per_block = max(1, 2 ** 22 // self.num_vertices)
+        for begin in range(0, self.num_vertices, rows_per_block):
+            end = min(begin + rows_per_block, self.num_vertices)
+            zeros = self.adj_matrix[begin:end] == 0
+            zeros[np.arange(end - begin), np.arange(begin, end)] = False
+            if np.any(zeros):
+                raise ValueError("No edge found to get weight.")
+
+    # Getting distances between vertices (vertex indices or their arrays) as float64
+    def get_distances(self, vertices_from, vertices_to):
+        distances = self.adj_matrix[np.add(vertices_from, self.offset), np.add(vertices_to, self.offset)]
+        return np.asarray(self.graph.decode_distances(distances), dtype=float)
+
+    # Getting distances from vertex to all vertices, in rolled_vertices order
+    def get_distance_row(self, vertex):
+        return self.get_distances(vertex, self.rolled_vertices)
+
+    # Getting distances from all vertices to vertex, in rolled_vertices order
+    def get_distance_column(self, vertex):
+        return self.get_distances(self.rolled_vertices, vertex)
+
+    # Resetting evaluation counters and best cost improvements record
+    # (improvements are (perf_counter time, evaluations, cost) of every new best evaluated cost)
+    def reset_counters(self):
+        self.num_evaluations = 0
+        self.num_feasibility_checks = 0
+        self.num_split_restarts = 0
+        self.best_cost = float('inf')
+        self.improvements = []
+
+    # Counting evaluations and recording improvement of the best evaluated cost
+    def count_evaluations(self, num_evaluations, cost):
+        self.num_evaluations += num_evaluations
+        if cost < self.best_cost:
+            self.best_cost = cost
+            self.improvements.append((time.perf_counter(), self.num_evaluations, cost))
+
+    # Calculating cost of given routes
+    def calculate_cost(self, routes):
+        distances = self.distances_list
+        total_cost = 0
+        for route in routes:
+            for vertex in range(len(route) - 1):
+                total_cost += distances[route[vertex]][route[vertex + 1]]
+        return round(total_cost, 2)
+
+    # Checking if vehicle with specified capacity can serve given solution
+    # Returns [initial bikes load, batteries load] or None if vehicle cannot serve it
+    def check_if_can_serve(self, partial_solution, capacity):
+        demands = self.demands_list
+        discharged_list = self.discharged_list
+
+        discharged = 0
+        demands_sum = 0
+        max_demands_sum = 0
+        min_demands_sum = 0
+        for vertex in partial_solution:
+            discharged += discharged_list[vertex]
+            demands_sum += demands[vertex]
+            if demands_sum > max_demands_sum:
+                max_demands_sum = demands_sum
+            elif demands_sum < min_demands_sum:
+                min_demands_sum = demands_sum
+
+        # Initial load covers the highest cumulated delivery,
+        # the vehicle is the most loaded after the highest cumulated pickup
+        self.num_feasibility_checks += 1
+        if (max_demands_sum - min_demands_sum) * 5 > capacity - discharged:
+            return None
+
+        return [max_demands_sum, discharged]
+
+    # Fitness function splitting solution into routes and calculating its cost, returns Solution
+    # (rng - RandomGenerator selecting vehicles, graph generator by default, cache - optional FitnessCache
+    #  of Split.OPTIMAL solutions, split_type - Split.GREEDY with randomly selected vehicles or deterministic
+    #  Split.OPTIMAL)
+    def fitness_function(self, solution, rng=None, cache=None, split_type=Split.GREEDY):
+        if cache is not None:
+            key = cache.get_key(self, solution)
+            params = cache.get(key)
+            if params is None:
+                params = self.fitness_function(solution, rng, split_type=split_type)
+                cache.put(key, params)
+            return params
+
+        if split_type == Split.OPTIMAL:
+            return self.optimal_split(solution)
+        elif split_type != Split.GREEDY:
+            raise ValueError("Unknown split type.")
+
+        rng = self.graph.get_rng(rng)
+        closest_warehouse = self.closest_warehouse_vertices[solution[0]]
+        capacity = closest_warehouse.select_vehicle(rng.random).capacity
+        state = (0, closest_warehouse, capacity, 0, 0, 0, 0, 0)
+        return self.split(solution, 0, state, array('i'), array('i'), array('i'), array('i'), rng)
+
+    # Fitness function of solution differing from the base solution from given position onwards,
+    # routes and cost up to that position are reused from the base solution split states
+    # (base_states - get_split_states() result of the same split type,
+    #  move_key - neighborhood type and move creating solution from the base solution, cache keys solution by it)
+    def fitness_function_from(self,
+                              solution,
+                              solution_idx,
+                              base_solution,
+                              base_states,
+                              rng=None,
+                              cache=None,
+                              split_type=Split.GREEDY,
+                              move_key=None):
+
+        if cache is not None:
+            if move_key is not None:
+                key = cache.get_move_key(self, base_solution, move_key)
+            else:
+                key = cache.get_key(self, solution)
+            params = cache.get(key)
+            if params is None:
+                params = self.fitness_function_from(solution, solution_idx, base_solution, base_states, rng,
+                                                    split_type=split_type)
+                cache.put(key, params)
+            return params
+
+        if solution_idx == 0:
+            return self.fitness_function(solution, rng, split_type=split_type)
+
+        if split_type == Split.OPTIMAL:
+            return self.optimal_split(solution, solution_idx, base_states)
+
+        *state, route_idx = base_states[solution_idx]
+        return self.split(
+            solution,
+            solution_idx,
+            state,
+            base_solution.route_offsets[:route_idx],
+            base_solution.depots[:route_idx],
+            base_solution.capacities[:route_idx + 1],
+            base_solution.loads[:2 * route_idx],
+            self.graph.get_rng(rng)
+        )
+
+    # Getting split state before each position of Solution:
+    # (route begin, warehouse, vehicle capacity, discharged, demands sum, max demands sum, min demands sum,
+    #  cost so far, route index) - index 0 is left empty, splitting from the beginning is not resumed
+    # Split.OPTIMAL states are its shortest path potentials, predecessors and route reaches
+    # (see get_optimal_split_potentials())
+    def get_split_states(self, solution, split_type=Split.GREEDY):
+        if split_type == Split.OPTIMAL:
+            return self.get_optimal_split_potentials(solution.tour)
+
+        distances = self.distances_list
+        demands = self.demands_list
+        discharged_list = self.discharged_list
+        warehouses = self.graph.list_warehouse_vertices
+        tour = solution.tour
+        route_offsets = solution.route_offsets
+
+        states = [None]
+        total_cost = 0
+        for route_idx, depot in enumerate(solution.depots):
+            warehouse = warehouses[depot + self.num_warehouses - 1]
+            capacity = solution.capacities[route_idx]
+            solution_begin = route_offsets[route_idx]
+
+            discharged = 0
+            demands_sum = 0
+            max_demands_sum = 0
+            min_demands_sum = 0
+            previous = depot
+            for vertex_idx in range(solution_begin, route_offsets[route_idx + 1]):
+                vertex = tour[vertex_idx]
+                total_cost += distances[previous][vertex]
+                discharged += discharged_list[vertex]
+                demands_sum += demands[vertex]
+                if demands_sum > max_demands_sum:
+                    max_demands_sum = demands_sum
+                elif demands_sum < min_demands_sum:
+                    min_demands_sum = demands_sum
+
+                states.append((solution_begin, warehouse, capacity, discharged, demands_sum,
+                               max_demands_sum, min_demands_sum, total_cost, route_idx))
+                previous = vertex
+
+            total_cost += distances[previous][depot]
+
+        return states
+
+    # Splitting solution into routes from given position and split state, routes split so far are given
+    # as Solution arrays (route offsets, depots, vehicle capacities, flattened initial loads), returns Solution
+    # Route load state is carried forward, so extending a route by one client takes constant time
+    def split(self, solution, solution_idx, state, route_offsets, depots, vehicles, loads, rng):
+        closest_warehouse_vertices = self.closest_warehouse_vertices
+        random_generator = rng.random
+        distances = self.distances_list
+        demands = self.demands_list
+        discharged_list = self.discharged_list
+
+        solution_len = len(solution)
+        (solution_begin, closest_warehouse, capacity, discharged,
+         demands_sum, max_demands_sum, min_demands_sum, total_cost) = state
+
+        # Every position is checked once, plus once again after every new vehicle selection
+        self.num_feasibility_checks += solution_len - solution_idx
+        restarts = 0
+
+        while solution_idx < solution_len:
+            vertex = solution[solution_idx]
+
+            next_discharged = discharged + discharged_list[vertex]
+            next_demands_sum = demands_sum + demands[vertex]
+            next_max_demands_sum = max_demands_sum if max_demands_sum > next_demands_sum else next_demands_sum
+            next_min_demands_sum = min_demands_sum if min_demands_sum < next_demands_sum else next_demands_sum
+
+            if (next_max_demands_sum - next_min_demands_sum) * 5 <= capacity - next_discharged:
+                if solution_idx == solution_begin:
+                    vehicles.append(capacity)
+                    total_cost += distances[closest_warehouse.index][vertex]
+                else:
+                    total_cost += distances[solution[solution_idx - 1]][vertex]
+
+                discharged = next_discharged
+                demands_sum = next_demands_sum
+                max_demands_sum = next_max_demands_sum
+                min_demands_sum = next_min_demands_sum
+                solution_idx += 1
+            else:  # vehicle cannot serve extended route
+                if solution_idx > solution_begin:
+                    total_cost += distances[solution[solution_idx - 1]][closest_warehouse.index]
+                    route_offsets.append(solution_begin)
+                    depots.append(closest_warehouse.index)
+                    loads.append(max_demands_sum)
+                    loads.append(discharged)
+
+                    closest_warehouse = closest_warehouse_vertices[vertex]
+                    solution_begin = solution_idx
+
+                    discharged = 0
+                    demands_sum = 0
+                    max_demands_sum = 0
+                    min_demands_sum = 0
+                capacity = closest_warehouse.select_vehicle(random_generator).capacity
+                restarts += 1
+
+        self.num_feasibility_checks += restarts
+        self.num_split_restarts += restarts
+        total_cost += distances[solution[solution_len - 1]][closest_warehouse.index]
+        route_offsets.append(solution_begin)
+        route_offsets.append(solution_len)
+        depots.append(closest_warehouse.index)
+        loads.append(max_demands_sum)
+        loads.append(discharged)
+
+        total_cost = round(total_cost, 2)
+        self.count_evaluations(1, total_cost)
+        return Solution(solution, total_cost, route_offsets, depots, vehicles, loads)
+
+    # Optimal split - getting distances of leaving every warehouse to vertex (in warehouses order and as
+    # (distance, warehouse position) pairs nearest first), of returning from vertex to every warehouse and the nearest
+    # return, lists indexed by vertex index - n x warehouses cells, no table of all routes (first vertex, last vertex)
+    # is kept, cheapest warehouse of route is looked for when the route is relaxed
+    def get_depot_distances(self):
+        if self.depot_distances is None:
+            warehouses = range(-self.num_warehouses + 1, 1)
+            leaving = np.array([self.get_distance_row(warehouse) for warehouse in warehouses], dtype=float).T
+            returning = np.array([self.get_distance_column(warehouse) for warehouse in warehouses], dtype=float).T
+            order = np.argsort(leaving, axis=1, kind='stable')
+            self.depot_distances = (
+                leaving.tolist(),
+                [list(zip(distances, indices)) for distances, indices in
+                 zip(np.take_along_axis(leaving, order, axis=1).tolist(), order.tolist())],
+                returning.tolist(),
+                returning.min(axis=1).tolist()
+            )
+
+        return self.depot_distances
+
+    # Getting cheapest warehouse of route from first to last vertex (the first of equally cheap ones)
+    def get_route_depot(self, first, last):
+        leaving, _, returning, _ = self.get_depot_distances()
+        costs = list(map(add, leaving[first], returning[last]))
+        return costs.index(min(costs)) - self.num_warehouses + 1
+
+    # Getting k nearest clients of every client, nearest first (list indexed by vertex index, warehouses get none)
+    # Distances are taken in row blocks of about 4M cells, so that large instances are not copied at once
+    def get_candidates(self, k):
+        if k < 1:
+            raise ValueError("At least one candidate is required.")
+
+        if k not in self.candidates:
+            num_clients = self.num_vertices - self.num_warehouses
+            num_candidates = min(k, num_clients - 1)
+
+            candidates = [[]]
+            rows_per_block = max(1, 2 ** 22 // num_clients)
+            for begin in range(1, num_clients + 1, rows_per_block):
+                end = min(begin + rows_per_block, num_clients + 1)
+                # Clients order by stored distances is the same as by decoded ones
+                distances = np.array(self.adj_matrix[begin + self.offset:end + self.offset,
+                                                     1 + self.offset:num_clients + 1 + self.offset], dtype=float)
+                distances[np.arange(end - begin), np.arange(begin - 1, end - 1)] = np.inf
+
+                nearest = np.argpartition(distances, num_candidates - 1, axis=1)[:, :num_candidates]
+                order = np.argsort(np.take_along_axis(distances, nearest, axis=1), axis=1, kind='stable')
+                candidates.extend((np.take_along_axis(nearest, order, axis=1) + 1).tolist())
+
+            self.candidates[k] = candidates
+
+        return self.candidates[k]
+
+    # Optimal split shortest path over routes DAG (arc i -> j is route of solution[i:j]), relaxed from given position,
+    # returns shortest path potentials and predecessors of every position and reach of every route begin
+    # (last position checked - route infeasible there or max_route_length reached)
+    # Potentials and predecessors up to the first changed position are final and reused from the base states,
+    # routes reaching it are relaxed again (feasible route stays feasible without its first client, so reach grows)
+    def get_optimal_split_potentials(self, solution, solution_idx=0, base_states=None):
+        distances = self.distances_list
+        demands = self.demands_list
+        discharged_list = self.discharged_list
+        _, sorted_leaving, returning, min_returning = self.get_depot_distances()
+        max_capacity = self.max_capacity
+
+        solution_len = len(solution)
+        max_route_length = self.max_route_length or solution_len
+
+        if base_states is None or solution_idx == 0:
+            potentials = [0.0] + [float('inf')] * solution_len
+            predecessors = [0] * (solution_len + 1)
+            reaches = []
+            relax_begin = 0
+        else:
+            base_potentials, base_predecessors, base_reaches = base_states
+            potentials = base_potentials[:solution_idx + 1] + [float('inf')] * (solution_len - solution_idx)
+            predecessors = base_predecessors[:solution_idx + 1] + [0] * (solution_len - solution_idx)
+
+            # Only routes reaching the first changed position are relaxed again
+            relax_begin = bisect_left(base_reaches, solution_idx, 0, solution_idx)
+            reaches = base_reaches[:relax_begin]
+
+        checks = 0
+        for route_begin in range(relax_begin, solution_len):
+            potential = potentials[route_begin]
+            route_leaving = sorted_leaving[solution[route_begin]]
+
+            previous = solution[route_begin]
+            path_cost = 0.0
+            discharged = 0
+            demands_sum = 0
+            max_demands_sum = 0
+            min_demands_sum = 0
+            for route_end in range(route_begin, min(route_begin + max_route_length, solution_len)):
+                vertex = solution[route_end]
+                path_cost += distances[previous][vertex]
+                previous = vertex
+
+                discharged += discharged_list[vertex]
+                demands_sum += demands[vertex]
+                if demands_sum > max_demands_sum:
+                    max_demands_sum = demands_sum
+                elif demands_sum < min_demands_sum:
+                    min_demands_sum = demands_sum
+
+                checks += 1
+                if (max_demands_sum - min_demands_sum) * 5 > max_capacity - discharged:
+                    break
+
+                # Warehouses are checked nearest first, until leaving one cannot be cheaper with any return
+                vertex_returning = returning[vertex]
+                vertex_min_returning = min_returning[vertex]
+                depot_cost = float('inf')
+                for leaving_distance, warehouse_idx in route_leaving:
+                    if leaving_distance + vertex_min_returning >= depot_cost:
+                        break
+                    warehouse_cost = leaving_distance + vertex_returning[warehouse_idx]
+                    if warehouse_cost < depot_cost:
+                        depot_cost = warehouse_cost
+
+                cost = potential + path_cost + depot_cost
+                if cost < potentials[route_end + 1]:
+                    potentials[route_end + 1] = cost
+                    predecessors[route_end + 1] = route_begin
+            reaches.append(route_end)
+
+        self.num_feasibility_checks += checks
+        if potentials[solution_len] == float('inf'):
+            raise ValueError("Solution cannot be split into routes served by available vehicles.")
+
+        return potentials, predecessors, reaches
+
+    # Optimal split - solution is cut into routes of the minimum total cost, every route gets its cheapest
+    # warehouse and the smallest vehicle able to serve it (vehicles are not drawn, the result is deterministic)
+    # Resumed from given position with base solution states (see get_split_states()), returns Solution
+    def optimal_split(self, solution, solution_idx=0, base_states=None):
+        potentials, predecessors, _ = self.get_optimal_split_potentials(solution, solution_idx, base_states)
+
+        # Routes are read backwards from the last position
+        route_ends = [len(solution)]
+        while route_ends[-1] > 0:
+            route_ends.append(predecessors[route_ends[-1]])
+        route_ends.reverse()
+
+        depots = array('i')
+        vehicles = array('i')
+        loads = array('i')
+        for begin, end in zip(route_ends, route_ends[1:]):
+            depot = self.get_route_depot(solution[begin], solution[end - 1])
+            max_demands_sum, discharged, required_capacity = self.get_route_loads(solution, begin, end)
+            capacities = self.sorted_capacities[depot + self.num_warehouses - 1]
+
+            depots.append(depot)
+            vehicles.append(capacities[bisect_left(capacities, required_capacity)])
+            loads.append(max_demands_sum)
+            loads.append(discharged)
+
+        total_cost = round(potentials[-1], 2)
+        self.count_evaluations(1, total_cost)
+        return Solution(solution, total_cost, array('i', route_ends), depots, vehicles, loads)
+
+    # Getting initial bikes load, batteries load and vehicle capacity required by route of solution[begin:end]
+    def get_route_loads(self, solution, begin, end):
+        demands = self.demands_list
+        discharged_list = self.discharged_list
+
+        discharged = 0
+        demands_sum = 0
+        max_demands_sum = 0
+        min_demands_sum = 0
+        for vertex in solution[begin:end]:
+            discharged += discharged_list[vertex]
+            demands_sum += demands[vertex]
+            if demands_sum > max_demands_sum:
+                max_demands_sum = demands_sum
+            elif demands_sum < min_demands_sum:
+                min_demands_sum = demands_sum
+
+        return max_demands_sum, discharged, (max_demands_sum - min_demands_sum) * 5 + discharged
+
+    # Probabilistic vehicle selection for given warehouses, returns vehicle capacities
+    def select_vehicles(self, warehouses, rng):
+        random_values = rng.numpy.random(len(warehouses))
+        vehicle_indices = np.sum(self.vehicle_probabilities[warehouses] <= random_values[:, None], axis=1)
+        return self.vehicle_capacities[warehouses, vehicle_indices]
+
+    # Fitness function of a batch of solutions (2-D array, solution per row), vectorized over the batch
+    # Returns costs, route begin flags and vehicle capacities of each solution position (see get_solution())
+    def fitness_function_batch(self, solutions, rng=None, split_type=Split.GREEDY):
+        if split_type != Split.GREEDY:
+            raise ValueError("Batch evaluation supports greedy split only.")
+
+        rng = self.graph.get_rng(rng)
+        solutions = np.asarray(solutions, dtype=np.int64)
+        batch_size, solution_len = solutions.shape
+        batch_indices = np.arange(batch_size)
+
+        route_begins = np.zeros((batch_size, solution_len), dtype=bool)
+        capacities = np.zeros((batch_size, solution_len), dtype=np.int64)
+
+        warehouse = self.closest_warehouses[solutions[:, 0]]
+        capacity = self.select_vehicles(warehouse, rng)
+        previous = warehouse.copy()  # route is opened once previous vertex is not the warehouse
+
+        # Current routes load state
+        discharged = np.zeros(batch_size, dtype=np.int64)
+        demands_sum = np.zeros(batch_size, dtype=np.int64)
+        max_demands_sum = np.zeros(batch_size, dtype=np.int64)
+        min_demands_sum = np.zeros(batch_size, dtype=np.int64)
+        total_cost = np.zeros(batch_size)
+
+        for solution_idx in range(solution_len):
+            vertex = solutions[:, solution_idx]
+            pending = batch_indices
+
+            while pending.size:
+                self.num_feasibility_checks += pending.size
+                pending_vertex = vertex[pending]
+                next_discharged = discharged[pending] + self.discharged[pending_vertex]
+                next_demands_sum = demands_sum[pending] + self.demands[pending_vertex]
+                next_max_demands_sum = np.maximum(max_demands_sum[pending], next_demands_sum)
+                next_min_demands_sum = np.minimum(min_demands_sum[pending], next_demands_sum)
+                served = (next_max_demands_sum - next_min_demands_sum) * 5 <= capacity[pending] - next_discharged
+
+                extended = pending[served]
+                route_begins[extended, solution_idx] = previous[extended] == warehouse[extended]
+                capacities[extended, solution_idx] = capacity[extended]
+                total_cost[extended] += self.get_distances(previous[extended], pending_vertex[served])
+                discharged[extended] = next_discharged[served]
+                demands_sum[extended] = next_demands_sum[served]
+                max_demands_sum[extended] = next_max_demands_sum[served]
+                min_demands_sum[extended] = next_min_demands_sum[served]
+                previous[extended] = pending_vertex[served]
+
+                # Vehicle cannot serve extended route - closing opened routes and selecting new vehicles
+                pending = pending[~served]
+                self.num_split_restarts += pending.size
+                closed = pending[previous[pending] != warehouse[pending]]
+                total_cost[closed] += self.get_distances(previous[closed], warehouse[closed])
+                warehouse[closed] = self.closest_warehouses[vertex[closed]]
+                previous[closed] = warehouse[closed]
+                discharged[closed] = 0
+                demands_sum[closed] = 0
+                max_demands_sum[closed] = 0
+                min_demands_sum[closed] = 0
+                capacity[pending] = self.select_vehicles(warehouse[pending], rng)
+
+        total_cost += self.get_distances(previous, warehouse)
+        costs = np.array([round(cost, 2) for cost in total_cost.tolist()])
+        self.count_evaluations(batch_size, float(costs.min()))
+
+        return costs, route_begins, capacities
+
+    # Getting Solution from route begin flags and vehicle capacities of its positions
+    # (single row of fitness_function_batch() result)
+    def get_solution(self, solution, route_begins, capacities):
+        solution = np.asarray(solution).tolist()
+        begins = np.flatnonzero(route_begins).tolist()
+        depots = [self.closest_warehouses_list[solution[begin]] for begin in begins]
+        vehicles = np.asarray(capacities)[begins].tolist()
+
+        loads = []
+        routes = []
+        for route_idx, (begin, end) in enumerate(zip(begins, begins[1:] + [len(solution)])):
+            loads.extend(self.check_if_can_serve(solution[begin:end], vehicles[route_idx]))
+            routes.append([depots[route_idx]] + solution[begin:end] + [depots[route_idx]])
+
+        return Solution.from_lists(solution, self.calculate_cost(routes), begins + [len(solution)], depots, vehicles, loads)
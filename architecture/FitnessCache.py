@@ -0,0 +1,86 @@
+from architecture.Utils import Split
+from collections import OrderedDict
+
+
+class FitnessCache:
+
+    # FitnessCache class constructor - evaluated solutions cache holding at most max_size entries,
+    # least recently used entries are evicted first
+    # Only Split.OPTIMAL solutions are cached and entries do not outlive one algorithm run (see start_run())
+    def __init__(self, max_size=100000):
+        if max_size < 1:
+            raise ValueError("Cache must hold at least one entry.")
+
+        self.max_size = max_size
+        self.entries = OrderedDict()
+        self.evaluator = None
+        self.hits = 0
+        self.misses = 0
+
+        # Key of the last base solution of neighbors keyed by moves (see get_move_key())
+        self.base_solution = None
+        self.base_key = None
+
+        # Nested runs (e.g. descent inside multistart) share entries of the outermost run
+        self.run_depth = 0
+
+    # Checking evaluator of solutions, cache is cleared when used with another evaluator
+    # (another graph or graph with changed edges)
+    def check_evaluator(self, evaluator):
+        if self.evaluator is not evaluator:
+            self.clear()
+            self.evaluator = evaluator
+
+    # Getting cache key of solution
+    def get_key(self, evaluator, solution):
+        self.check_evaluator(evaluator)
+        return tuple(solution)
+
+    # Getting cache key of neighbor created from base Solution by move (move_key - neighborhood type and move),
+    # base solution is copied into key once for all its neighbors, not for every neighbor
+    # (neighbor keyed by move is not found by its get_key() key, both are the same solution params)
+    def get_move_key(self, evaluator, base_solution, move_key):
+        self.check_evaluator(evaluator)
+        if base_solution is not self.base_solution:
+            self.base_solution = base_solution
+            self.base_key = tuple(base_solution.tour)
+        return self.base_key, move_key
+
+    # Starting algorithm run of given split type - cached solution params are returned without splitting solution
+    # again, so only deterministic Split.OPTIMAL is cached (greedy split draws vehicles at random, its cached draw
+    # would be replayed and the run would differ from the same seed run without cache)
+    # The outermost run clears entries (e.g. other maximum route length)
+    def start_run(self, split_type):
+        if split_type != Split.OPTIMAL:
+            raise ValueError("Only Split.OPTIMAL solutions can be cached, greedy split draws vehicles at random.")
+
+        if self.run_depth == 0:
+            self.clear()
+        self.run_depth += 1
+
+    # Ending algorithm run
+    def end_run(self):
+        self.run_depth -= 1
+
+    # Getting cached solution params, None if solution is not cached
+    def get(self, key):
+        params = self.entries.get(key)
+        if params is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+        return params
+
+    # Caching solution params
+    def put(self, key, params):
+        self.entries[key] = params
+        self.entries.move_to_end(key)
+        if len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    # Removing all entries
+    def clear(self):
+        self.entries.clear()
+        self.base_solution = None
+        self.base_key = None
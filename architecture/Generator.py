@@ -0,0 +1,183 @@
+from architecture.Graph import Graph
+from architecture.RandomGenerator import RandomGenerator
+from architecture.Utils import Layout
+import numpy as np
+import os
+
+
+# Generating vertices coordinates in square of given size (warehouses first) - warehouses are always spread
+# uniformly, clustered clients are normally distributed around uniformly placed cluster centers
+def generate_coordinates(num_vertices,
+                         num_warehouses,
+                         layout,
+                         rng,
+                         size=100.0,
+                         num_clusters=None,
+                         cluster_deviation=0.05):
+
+    coordinates = rng.numpy.uniform(0, size, (num_vertices, 2))
+
+    if layout == Layout.CLUSTERED:
+        num_clients = num_vertices - num_warehouses
+        if num_clusters is None:
+            num_clusters = max(1, round(np.sqrt(num_clients) / 2))
+
+        centers = rng.numpy.uniform(0, size, (num_clusters, 2))
+        clusters = rng.numpy.integers(num_clusters, size=num_clients)
+        offsets = rng.numpy.normal(0, cluster_deviation * size, (num_clients, 2))
+        coordinates[num_warehouses:] = np.clip(centers[clusters] + offsets, 0, size)
+
+    elif layout != Layout.UNIFORM:
+        raise ValueError("Unknown layout type.")
+
+    return coordinates
+
+
+# Generating client vertices params (discharged, capacity, stored), drawn as in Graph.generate_and_write_vertices_to_file()
+def generate_clients(num_clients, rng, vertices_range=(0, 10), discharged_percent=30):
+    min_vert, max_vert = vertices_range
+
+    capacity = rng.numpy.integers(2, max_vert, size=num_clients, endpoint=True)
+    stored = rng.numpy.integers(min_vert, max_vert, size=num_clients, endpoint=True)
+    while np.any(same := stored == capacity):
+        stored[same] = rng.numpy.integers(min_vert, max_vert, size=np.count_nonzero(same), endpoint=True)
+
+    discharged = np.where(
+        rng.numpy.integers(1, 100, size=num_clients, endpoint=True) <= discharged_percent,
+        rng.numpy.integers(0, stored, endpoint=True),
+        0
+    )
+
+    return np.stack([discharged, capacity, stored], axis=1)
+
+
+# Getting matrix row blocks computed at once, about 4M cells each
+def get_row_blocks(num_vertices):
+    rows_per_block = max(1, 2 ** 22 // num_vertices)
+    for begin in range(0, num_vertices, rows_per_block):
+        yield begin, min(begin + rows_per_block, num_vertices)
+
+
+# Computing Euclidean distances from rows block vertices, rounded to two decimal places as generated edges
+# (coinciding vertices are kept at the smallest distance, since zero weight means no edge)
+def get_distances_block(coordinates, begin, end):
+    distances = np.subtract.outer(coordinates[begin:end, 0], coordinates[:, 0])
+    differences = np.subtract.outer(coordinates[begin:end, 1], coordinates[:, 1])
+
+    # Computed in place, blocks are large
+    np.multiply(distances, distances, out=distances)
+    np.multiply(differences, differences, out=differences)
+    np.add(distances, differences, out=distances)
+    np.sqrt(distances, out=distances)
+    np.round(distances, 2, out=distances)
+    np.maximum(distances, 0.01, out=distances)
+
+    distances[np.arange(end - begin), np.arange(begin, end)] = 0
+    return distances
+
+
+# Writing distances between vertices into edges file (u, v, weight for u < v)
+def write_edges_to_file(filename, coordinates, num_warehouses):
+    num_vertices = len(coordinates)
+    with open(filename, 'w') as file:
+        for begin, end in get_row_blocks(num_vertices):
+            distances = get_distances_block(coordinates, begin, end)
+            rows, cols = np.nonzero(np.arange(num_vertices)[None, :] > np.arange(begin, end)[:, None])
+            edges = np.column_stack([rows + begin - num_warehouses + 1, cols - num_warehouses + 1, distances[rows, cols]])
+            file.write(("%d, %d, %.2f\n" * len(edges)) % tuple(edges.ravel().tolist()))
+
+
+# Writing distances between vertices into binary instance matrix,
+# integer types store distances multiplied by scale and rounded
+def write_distances_to_directory(directory, coordinates, dtype=np.float64, scale=None):
+    num_vertices = len(coordinates)
+    matrix = np.lib.format.open_memmap(
+        os.path.join(directory, "distances.npy"),
+        mode='w+',
+        dtype=dtype,
+        shape=(num_vertices, num_vertices)
+    )
+
+    for begin, end in get_row_blocks(num_vertices):
+        distances = get_distances_block(coordinates, begin, end)
+        matrix[begin:end] = np.rint(distances * scale) if scale is not None else distances
+
+    matrix.flush()
+
+
+# Generating new instance of vertices placed in square of given size with Euclidean distances,
+# written as text files (edges, vertices and optional locations) or binary instance directory if given
+# dtype, scale - binary distances storage (see Graph.write_instance_to_directory())
+def generate_instance(num_vertices,
+                      num_warehouses,
+                      vehicles_and_capacities,
+                      layout=Layout.UNIFORM,
+                      size=100.0,
+                      num_clusters=None,
+                      discharged_percent=30,
+                      vertices_range=(0, 10),
+                      filename_edges="data/graph-edges.txt",
+                      filename_vertices="data/graph-vertices.txt",
+                      filename_locations=None,
+                      filename_instance=None,
+                      dtype=np.float64,
+                      scale=None,
+                      seed=None):
+
+    if num_warehouses < 1 or num_warehouses > num_vertices - 1:
+        raise ValueError("Incorrect parameters. At least one warehouse and one client vertex are required.")
+
+    dtype = np.dtype(dtype)
+    if scale is None and not np.issubdtype(dtype, np.floating):
+        raise ValueError("Integer distances storage requires scale.")
+    if scale is not None and np.issubdtype(dtype, np.integer) and np.rint(size * np.sqrt(2) * scale) > np.iinfo(dtype).max:
+        raise ValueError(f"Scaled distances do not fit into {dtype.name}.")
+
+    # Graph gets own random stream, independent of instance generation
+    generation_rng, graph_rng = RandomGenerator(seed).spawn(2)
+
+    coordinates = generate_coordinates(num_vertices, num_warehouses, layout, generation_rng, size, num_clusters)
+    clients = generate_clients(num_vertices - num_warehouses, generation_rng, vertices_range, discharged_percent)
+
+    if filename_instance is not None:
+        os.makedirs(filename_instance, exist_ok=True)
+        write_distances_to_directory(filename_instance, coordinates, dtype, scale)
+        np.save(os.path.join(filename_instance, "clients.npy"), clients.astype(np.int32))
+        np.save(os.path.join(filename_instance, "coordinates.npy"), coordinates)
+        Graph.write_instance_params(
+            filename_instance,
+            num_vertices,
+            num_warehouses,
+            vehicles_and_capacities,
+            discharged_percent,
+            False,
+            dtype,
+            scale
+        )
+
+        return Graph(
+            num_vertices=num_vertices,
+            num_warehouses=num_warehouses,
+            vehicles_and_capacities=vehicles_and_capacities,
+            discharged_percent=discharged_percent,
+            seed=graph_rng.seed_sequence,
+            filename_instance=filename_instance
+        )
+
+    write_edges_to_file(filename_edges, coordinates, num_warehouses)
+    np.savetxt(filename_vertices, clients, fmt='%d', delimiter=', ')
+    if filename_locations is not None:
+        vertices = np.arange(num_vertices) - num_warehouses + 1
+        np.savetxt(filename_locations, np.column_stack([vertices, coordinates]), fmt=['%d', '%f', '%f'], delimiter=', ')
+
+    graph = Graph(
+        num_vertices=num_vertices,
+        num_warehouses=num_warehouses,
+        vehicles_and_capacities=vehicles_and_capacities,
+        discharged_percent=discharged_percent,
+        filename_edges=filename_edges,
+        filename_vertices=filename_vertices,
+        seed=graph_rng.seed_sequence
+    )
+    graph.coordinates = coordinates
+    return graph
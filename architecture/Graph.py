@@ -1,9 +1,13 @@
 from architecture.WarehouseVertex import WarehouseVertex
 from architecture.ClientVertex import ClientVertex
+from architecture.Evaluator import Evaluator
+from architecture.RandomGenerator import RandomGenerator
 import matplotlib.pyplot as plt
 import networkx as nx
 import numpy as np
-import random
+import warnings
+import json
+import os
 
 
 class Graph:
@@ -20,7 +24,9 @@ class Graph:
                  generate_new_vertices=False,
                  vertices_range=(0, 10),
                  filename_vertices="data/graph-vertices.txt",
-                 real_data=False):
+                 real_data=False,
+                 seed=None,
+                 filename_instance=None):
 
         if num_vertices < 2:
             raise ValueError("Graph must have at least two vertices.")
@@ -33,49 +39,76 @@ class Graph:
 
         self.num_vertices = num_vertices
         self.num_warehouses = num_warehouses
+        self.vehicles_and_capacities = vehicles_and_capacities
         self.discharged_percent = discharged_percent
         self.real_data = real_data
 
+        # Default random generator of graph generation and algorithms run without own seed
+        self.rng = RandomGenerator(seed)
+
         self.edges_range = edges_range
         self.vertices_range = vertices_range
 
         self.filename_edges = filename_edges
         self.filename_vertices = filename_vertices
+        self.filename_instance = filename_instance
+
+        # Vertex coordinates (warehouses first), known for binary instances only
+        self.coordinates = None
 
         self.list_client_vertices = [ClientVertex(i, 0, 0, 0)
                                      for i in range(1, self.num_vertices - self.num_warehouses + 1)]
         self.list_warehouse_vertices = [WarehouseVertex(i, vehicles_and_capacities)
                                         for i in range(-self.num_warehouses + 1, 1)]
 
-        if generate_new_edges and not self.real_data:
+        if generate_new_edges and not self.real_data and self.filename_instance is None:
             self.generate_and_write_edges_to_file(
                 min_weight=self.edges_range[0],
                 max_weight=self.edges_range[1]
             )
 
-        if generate_new_vertices and not self.real_data:
+        if generate_new_vertices and not self.real_data and self.filename_instance is None:
             self.generate_and_write_vertices_to_file(
                 min_vert=self.vertices_range[0],
                 max_vert=self.vertices_range[1]
             )
 
-        if not self.real_data and self.check_if_can_read():
-            raise ValueError("Incorrect parameters. Generate new valid graph or provide valid parameters.")
-
-        self.graph = nx.complete_graph(self.num_vertices - self.num_warehouses + 1)
+        self.nx_graph = None
         self.adj_matrix = np.zeros((self.num_vertices, self.num_vertices))
+        self.evaluator = None
+
+        # Binary instance distances - scale of integer storage (None - distances stored as they are)
+        # and whether adj_matrix is still the memory-mapped instance file (not modified since read)
+        self.distance_scale = None
+        self.mapped_distances = False
+
+        # Closest warehouse index of every client vertex with its distances from and back to the warehouse
+        # (indexed as list_client_vertices, updated whenever warehouse edges change)
+        num_clients = self.num_vertices - self.num_warehouses
+        self.closest_warehouses = np.zeros(num_clients, dtype=int)
+        self.closest_warehouse_distances = np.full(num_clients, np.inf)
+        self.closest_warehouse_return_distances = np.zeros(num_clients)
+
+        if self.filename_instance is not None:
+            self.read_instance_from_directory()
+        else:
+            self.read_edges_from_file()
+            self.read_vertices_from_file()
 
-        self.read_edges_from_file()
-        self.read_vertices_from_file()
+    # Reading file of comma separated triplets into (lines, 3) array
+    @staticmethod
+    def read_triplets(filename, dtype):
+        try:
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", UserWarning)  # Empty file warning, reported by count check
+                triplets = np.loadtxt(filename, delimiter=',', dtype=dtype, ndmin=2)
+        except ValueError as error:
+            raise ValueError(f"Incorrect file {filename}: {error}") from error
 
-    # File readability conditions check:
-    # 1. Checking if edge parameters match number of vertices, edges = (vertices * vertices - 1) / 2
-    # 2. Checking if edges generated for proper number of warehouses
-    # 3. Checking if vertices parameters match number of vertices
-    def check_if_can_read(self):
-        return (sum(1 for _ in open(self.filename_edges, 'r')) != self.num_vertices * (self.num_vertices - 1) / 2) \
-            or (int(open(self.filename_edges, 'r').readline().split(',')[0]) != -self.num_warehouses + 1) \
-            or (sum(1 for _ in open(self.filename_vertices, 'r')) != self.num_vertices - self.num_warehouses)
+        if triplets.size and triplets.shape[1] != 3:
+            raise ValueError(f"Incorrect file {filename}: three comma separated values per line expected.")
+
+        return triplets.reshape(-1, 3)
 
     # Adding edge to graph and adjacency matrix
     def add_edge(self, u, v, weight):
@@ -85,72 +118,303 @@ class Graph:
             if not self.real_data and self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] != 0:
                 raise ValueError("Attempting to add the existing edge.")
 
-        self.graph.add_edge(u, v, weight=weight)
-        self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] = weight
+        self.evaluator = None
+        self.nx_graph = None
+        self.mapped_distances = False
+        self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] = self.encode_distance(weight)
         if not self.real_data:
-            self.adj_matrix[v + self.num_warehouses - 1][u + self.num_warehouses - 1] = weight
+            self.adj_matrix[v + self.num_warehouses - 1][u + self.num_warehouses - 1] = self.encode_distance(weight)
+
+        if min(u, v) <= 0 < max(u, v):
+            self.update_closest_warehouses([max(u, v)])
 
     # Removing edge from graph and adjacency matrix
     def remove_edge(self, u, v):
-        if u == v or not (self.graph.has_edge(u, v)):
+        if u == v or (self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] == 0
+                      and self.adj_matrix[v + self.num_warehouses - 1][u + self.num_warehouses - 1] == 0):
             raise ValueError("No edge is found for removal.")
 
-        self.graph.remove_edge(u, v)
+        self.evaluator = None
+        self.nx_graph = None
+        self.mapped_distances = False
         self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] = 0
         self.adj_matrix[v + self.num_warehouses - 1][u + self.num_warehouses - 1] = 0
 
-    # Generating new edges parameters and writing them into a file
+        if min(u, v) <= 0 < max(u, v):
+            self.update_closest_warehouses([max(u, v)])
+
+    # Generating new edges parameters and writing them into a file (uniformly random weights, not metric -
+    # Euclidean instances are generated by Generator.generate_instance())
     def generate_and_write_edges_to_file(self, min_weight=1.0, max_weight=10.0):
         with open(self.filename_edges, 'w') as file:
             for u in range(self.num_vertices):
                 for v in range(u + 1, self.num_vertices):
                     file.write(f"{u - self.num_warehouses + 1}, "
                                f"{v - self.num_warehouses + 1}, "
-                               f"{round(random.uniform(min_weight, max_weight), 2)}\n")
+                               f"{round(self.rng.random.uniform(min_weight, max_weight), 2)}\n")
 
     # Generating new vertices params and writing them into a file
     def generate_and_write_vertices_to_file(self, min_vert=0, max_vert=10):
         with open(self.filename_vertices, 'w') as file:
             for _ in range(self.num_vertices - self.num_warehouses):
-                capacity = random.randint(2, max_vert)
-                stored = random.randint(min_vert, max_vert)
+                capacity = self.rng.random.randint(2, max_vert)
+                stored = self.rng.random.randint(min_vert, max_vert)
                 while stored == capacity:
-                    stored = random.randint(min_vert, max_vert)
+                    stored = self.rng.random.randint(min_vert, max_vert)
 
-                if random.randint(1, 100) <= self.discharged_percent:
-                    discharged = random.randint(0, stored)
+                if self.rng.random.randint(1, 100) <= self.discharged_percent:
+                    discharged = self.rng.random.randint(0, stored)
                 else:
                     discharged = 0
 
                 file.write(f"{discharged}, {capacity}, {stored}\n")
 
-    # Reading edges from file
+    # Reading edges from file in one pass, validation conditions:
+    # 1. Edges match number of vertices, edges = vertices * (vertices - 1) / 2 (every direction for real data)
+    # 2. Edges generated for proper number of warehouses (vertex indices start at -warehouses + 1)
+    # 3. No self-loops and no repeated edges
     def read_edges_from_file(self):
-        with open(self.filename_edges, 'r') as file:
-            for line in file:
-                u, v, weight = map(float, line.strip().split(','))
-                self.add_edge(int(u), int(v), weight)
+        edges = self.read_triplets(self.filename_edges, float)
+        num_edges = self.num_vertices * (self.num_vertices - 1) // (1 if self.real_data else 2)
+        if len(edges) != num_edges:
+            raise ValueError(f"Incorrect parameters. Edges file {self.filename_edges} has {len(edges)} edges, "
+                             f"{num_edges} expected for {self.num_vertices} vertices. "
+                             f"Generate new valid graph or provide valid parameters.")
+
+        vertices = edges[:, :2].astype(int)
+        if np.any(vertices != edges[:, :2]):
+            raise ValueError(f"Incorrect file {self.filename_edges}: vertex indices must be integers.")
+
+        first_vertex = -self.num_warehouses + 1
+        if vertices.min() != first_vertex or vertices.max() != self.num_vertices + first_vertex - 1:
+            raise ValueError(f"Incorrect parameters. Edges file {self.filename_edges} has vertices "
+                             f"from {vertices.min()} to {vertices.max()}, {first_vertex} to "
+                             f"{self.num_vertices + first_vertex - 1} expected for {self.num_warehouses} warehouses. "
+                             f"Generate new valid graph or provide valid parameters.")
+
+        u, v = vertices[:, 0], vertices[:, 1]
+        weights = edges[:, 2]
+        rows, cols = u - first_vertex, v - first_vertex
+
+        if np.any(u == v):
+            raise ValueError(f"Attempting to add self-loop edge {u[u == v][0]}.")
+
+        # Undirected edges are identified by unordered pairs
+        keys = rows * self.num_vertices + cols if self.real_data \
+            else np.minimum(rows, cols) * self.num_vertices + np.maximum(rows, cols)
+        unique_keys, first_lines, counts = np.unique(keys, return_index=True, return_counts=True)
+        if len(unique_keys) != len(keys):
+            line = first_lines[np.argmax(counts > 1)]
+            raise ValueError(f"Attempting to add the existing edge ({u[line]}, {v[line]}).")
+
+        self.evaluator = None
+        self.adj_matrix[rows, cols] = weights
+        if not self.real_data:
+            self.adj_matrix[cols, rows] = weights
+        self.nx_graph = None
+
+        self.update_closest_warehouses()
 
     # Reading vertices from file
     def read_vertices_from_file(self):
-        with open(self.filename_vertices, 'r') as file:
-            for idx, line in enumerate(file):
-                discharged, capacity, stored = map(int, line.strip().split(','))
-                self.list_client_vertices[idx].discharged = discharged
-                self.list_client_vertices[idx].capacity = capacity
-                self.list_client_vertices[idx].stored = stored
+        vertices = self.read_triplets(self.filename_vertices, int)
+        if len(vertices) != len(self.list_client_vertices):
+            raise ValueError(f"Incorrect parameters. Vertices file {self.filename_vertices} has {len(vertices)} "
+                             f"vertices, {len(self.list_client_vertices)} client vertices expected. "
+                             f"Generate new valid graph or provide valid parameters.")
+
+        self.evaluator = None
+        for vertex, (discharged, capacity, stored) in zip(self.list_client_vertices, vertices.tolist()):
+            vertex.discharged = discharged
+            vertex.capacity = capacity
+            vertex.stored = stored
+
+    # Writing graph into binary instance directory:
+    #   instance.json   - graph parameters, fleet and distances storage
+    #   distances.npy   - distance matrix (warehouses first, as adj_matrix)
+    #   clients.npy     - client vertices params (discharged, capacity, stored)
+    #   coordinates.npy - vertex coordinates, if known
+    # dtype - distances storage type, integer types store distances multiplied by scale and rounded
+    def write_instance_to_directory(self, directory, dtype=np.float64, scale=None, coordinates=None):
+        dtype = np.dtype(dtype)
+        distances = np.asarray(self.decode_distances(self.adj_matrix), dtype=float)
+
+        if scale is not None:
+            distances = np.rint(distances * scale)
+            if np.issubdtype(dtype, np.integer) and distances.max() > np.iinfo(dtype).max:
+                raise ValueError(f"Scaled distances do not fit into {dtype.name}.")
+        elif not np.issubdtype(dtype, np.floating):
+            raise ValueError("Integer distances storage requires scale.")
+
+        if coordinates is None:
+            coordinates = self.coordinates
+
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, "distances.npy"), distances.astype(dtype))
+        np.save(os.path.join(directory, "clients.npy"), np.array(
+            [[vertex.discharged, vertex.capacity, vertex.stored] for vertex in self.list_client_vertices],
+            dtype=np.int32
+        ).reshape(-1, 3))
+        if coordinates is not None:
+            np.save(os.path.join(directory, "coordinates.npy"), np.asarray(coordinates, dtype=float))
+
+        self.write_instance_params(
+            directory,
+            self.num_vertices,
+            self.num_warehouses,
+            self.vehicles_and_capacities,
+            self.discharged_percent,
+            self.real_data,
+            dtype,
+            scale
+        )
+
+    # Writing binary instance parameters file
+    @staticmethod
+    def write_instance_params(directory,
+                              num_vertices,
+                              num_warehouses,
+                              vehicles_and_capacities,
+                              discharged_percent,
+                              real_data,
+                              dtype,
+                              scale):
+
+        with open(os.path.join(directory, "instance.json"), 'w') as file:
+            json.dump({
+                'num_vertices': num_vertices,
+                'num_warehouses': num_warehouses,
+                'vehicles_and_capacities': [list(vehicles) for vehicles in vehicles_and_capacities],
+                'discharged_percent': discharged_percent,
+                'real_data': real_data,
+                'dtype': np.dtype(dtype).name,
+                'scale': scale
+            }, file, indent=4)
+
+    # Opening binary instance arrays - memory-mapped distances (copy-on-write, pages are shared between processes)
+    # and coordinates (None if not known)
+    def load_instance_arrays(self):
+        distances = np.load(os.path.join(self.filename_instance, "distances.npy"), mmap_mode='c')
+
+        coordinates = None
+        filename_coordinates = os.path.join(self.filename_instance, "coordinates.npy")
+        if os.path.exists(filename_coordinates):
+            coordinates = np.load(filename_coordinates, mmap_mode='r')
+
+        return distances, coordinates
+
+    # Reading graph from binary instance directory, distances are memory-mapped in their storage type
+    # (scaled integers are decoded when read, see decode_distances())
+    def read_instance_from_directory(self):
+        with open(os.path.join(self.filename_instance, "instance.json"), 'r') as file:
+            params = json.load(file)
+
+        if params['num_vertices'] != self.num_vertices or params['num_warehouses'] != self.num_warehouses:
+            raise ValueError(f"Incorrect parameters. Instance {self.filename_instance} has "
+                             f"{params['num_vertices']} vertices and {params['num_warehouses']} warehouses. "
+                             f"Generate new valid graph or provide valid parameters.")
+
+        distances, coordinates = self.load_instance_arrays()
+        if distances.shape != (self.num_vertices, self.num_vertices):
+            raise ValueError(f"Incorrect instance {self.filename_instance}: distance matrix of shape "
+                             f"{distances.shape}, ({self.num_vertices}, {self.num_vertices}) expected.")
+
+        clients = np.load(os.path.join(self.filename_instance, "clients.npy"))
+        if clients.shape != (len(self.list_client_vertices), 3):
+            raise ValueError(f"Incorrect instance {self.filename_instance}: client params of shape "
+                             f"{clients.shape}, ({len(self.list_client_vertices)}, 3) expected.")
+
+        if coordinates is not None:
+            self.coordinates = coordinates
+
+        self.evaluator = None
+        self.adj_matrix = distances
+        self.distance_scale = params['scale']
+        self.mapped_distances = True
+
+        self.nx_graph = None
+
+        for vertex, (discharged, capacity, stored) in zip(self.list_client_vertices, clients.tolist()):
+            vertex.discharged = discharged
+            vertex.capacity = capacity
+            vertex.stored = stored
+
+        self.update_closest_warehouses()
+
+    # Graph is pickled (e.g. shipped to worker processes) without its evaluator and plotting graph, built again
+    # on first use, memory-mapped instance distances are not copied but mapped again from instance directory
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['evaluator'] = None
+        state['nx_graph'] = None
+        if self.mapped_distances:
+            state['adj_matrix'] = None
+            state['coordinates'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        if self.mapped_distances:
+            self.adj_matrix, self.coordinates = self.load_instance_arrays()
+
+    # Decoding distances read from adjacency matrix (scaled integer storage of binary instances)
+    def decode_distances(self, distances):
+        if self.distance_scale is None:
+            return distances
+        return distances / self.distance_scale
+
+    # Encoding distance written into adjacency matrix
+    def encode_distance(self, distance):
+        if self.distance_scale is None:
+            return distance
+        return round(distance * self.distance_scale)
+
+    # NetworkX graph used for plotting only, built from adjacency matrix on first use
+    # (weight of directed real data edges is the one from the later vertex, as when read from file)
+    @property
+    def graph(self):
+        if self.nx_graph is None:
+            first_vertex = -self.num_warehouses + 1
+            rows, cols = np.triu_indices(self.num_vertices, 1)
+            weights = np.where(self.adj_matrix[cols, rows] != 0, self.adj_matrix[cols, rows], self.adj_matrix[rows, cols])
+            weights = self.decode_distances(weights)
+            edges = weights != 0
+
+            self.nx_graph = nx.Graph()
+            self.nx_graph.add_nodes_from(range(self.num_vertices + first_vertex))
+            self.nx_graph.add_nodes_from(range(first_vertex, 0))
+            self.nx_graph.add_weighted_edges_from(zip(
+                (rows[edges] + first_vertex).tolist(),
+                (cols[edges] + first_vertex).tolist(),
+                np.asarray(weights[edges], dtype=float).tolist()
+            ))
+        return self.nx_graph
 
     # Getting edge weight
     def get_weight(self, u, v):
         if self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1] == 0:
             raise ValueError("No edge found to get weight.")
 
-        return self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1]
+        return self.decode_distances(self.adj_matrix[u + self.num_warehouses - 1][v + self.num_warehouses - 1])
+
+    # Getting solution evaluator shared by all algorithms, built on first use
+    def get_evaluator(self):
+        if self.evaluator is None:
+            self.evaluator = Evaluator(self)
+        return self.evaluator
+
+    # Getting random generator of a run - graph generator by default, given one or new one for given seed
+    def get_rng(self, seed=None):
+        if seed is None:
+            return self.rng
+        if isinstance(seed, RandomGenerator):
+            return seed
+        return RandomGenerator(seed)
 
     # Creating vertices random permutation
-    def get_vertices_permutation(self):
+    def get_vertices_permutation(self, rng=None):
         permutation = list(range(1, self.num_vertices - self.num_warehouses + 1))
-        random.shuffle(permutation)
+        self.get_rng(rng).random.shuffle(permutation)
         return permutation
 
     # Getting vertex object by given index
@@ -160,26 +424,37 @@ class Graph:
     def get_client_vertices_len(self):
         return len(self.list_client_vertices)
 
+    # Updating closest warehouses of given client vertices (all by default)
+    def update_closest_warehouses(self, vertices=None):
+        if vertices is None:
+            vertices = range(1, self.num_vertices - self.num_warehouses + 1)
+        clients = np.asarray(vertices, dtype=int) - 1
+        rows = clients + self.num_warehouses
+
+        # Missing edges (zero weight) are never the closest
+        distances = self.decode_distances(self.adj_matrix[:self.num_warehouses, rows])
+        distances = np.where(distances == 0, np.inf, distances)
+        closest = np.argmin(distances, axis=0)
+
+        self.closest_warehouses[clients] = closest - self.num_warehouses + 1
+        self.closest_warehouse_distances[clients] = distances[closest, np.arange(len(clients))]
+        self.closest_warehouse_return_distances[clients] = self.decode_distances(self.adj_matrix[rows, closest])
+
     # Getting the closest warehouse to given vertex
     def get_closest_warehouse(self, vertex):
-        closest_warehouse = None
-        warehouse_weight = float('inf')
+        if self.closest_warehouse_distances[vertex - 1] == np.inf:
+            raise ValueError("No edge found to get weight.")
 
-        for warehouse in self.list_warehouse_vertices:
-            weight = self.get_weight(warehouse.index, vertex)
-            if weight < warehouse_weight:
-                closest_warehouse = warehouse
-                warehouse_weight = weight
-        return closest_warehouse
+        return self.list_warehouse_vertices[self.closest_warehouses[vertex - 1] + self.num_warehouses - 1]
 
     # Graph validation
     def check_graph_correctness(self):
-        for u, v in self.graph.edges():
-            if self.adj_matrix[u][v] == 0:
-                raise ValueError("Graph not complete (edge with weight 0).")
+        off_diagonal = ~np.eye(self.num_vertices, dtype=bool)
+        if np.any(self.adj_matrix[off_diagonal] == 0):
+            raise ValueError("Graph not complete (edge with weight 0).")
 
-            if self.adj_matrix[u][v] < 0:
-                raise ValueError("Edge with non-positive weight.")
+        if np.any(self.adj_matrix[off_diagonal] < 0):
+            raise ValueError("Edge with non-positive weight.")
 
     # Displaying adjacency matrix
     def print_adj_matrix(self):
@@ -190,7 +465,7 @@ class Graph:
             print(f"{vert:7}", end=" ")
         print()
 
-        for idx, row in enumerate(self.adj_matrix):
+        for idx, row in enumerate(self.decode_distances(self.adj_matrix)):
             print(f"{idx - self.num_warehouses + 1:7}  {' '.join(f'{val:7}' for val in row)}")
         print("\n")
 
@@ -0,0 +1,87 @@
+from architecture.Graph import Graph
+import numpy as np
+import json
+import glob
+import os
+
+
+# Reading graph from binary instance directory (see Graph.write_instance_to_directory()),
+# instance fleet is used unless other one is given
+def read_instance(directory, vehicles_and_capacities=None, seed=None):
+    with open(os.path.join(directory, "instance.json"), 'r') as file:
+        params = json.load(file)
+
+    if vehicles_and_capacities is None:
+        vehicles_and_capacities = [tuple(vehicles) for vehicles in params['vehicles_and_capacities']]
+
+    return Graph(
+        num_vertices=params['num_vertices'],
+        num_warehouses=params['num_warehouses'],
+        vehicles_and_capacities=vehicles_and_capacities,
+        discharged_percent=params['discharged_percent'],
+        real_data=params['real_data'],
+        seed=seed,
+        filename_instance=directory
+    )
+
+
+# Reading graph from text instance files, number of vertices and warehouses are read from edges file
+def read_text_instance(filename_edges, filename_vertices, vehicles_and_capacities, real_data=False, seed=None):
+    vertices = Graph.read_triplets(filename_edges, float)[:, :2]
+    num_warehouses = 1 - int(vertices.min())
+    num_vertices = int(vertices.max()) + num_warehouses
+
+    return Graph(
+        num_vertices=num_vertices,
+        num_warehouses=num_warehouses,
+        vehicles_and_capacities=vehicles_and_capacities,
+        filename_edges=filename_edges,
+        filename_vertices=filename_vertices,
+        real_data=real_data,
+        seed=seed
+    )
+
+
+# Converting text instance into binary instance directory (see read_text_instance())
+# filename_locations - optional coordinates file (vertex, lat, lon), as written by OpenData.extract_data()
+def convert_text_instance(filename_edges,
+                          filename_vertices,
+                          directory,
+                          vehicles_and_capacities,
+                          real_data=False,
+                          dtype=np.float64,
+                          scale=None,
+                          filename_locations=None):
+
+    graph = read_text_instance(filename_edges, filename_vertices, vehicles_and_capacities, real_data)
+
+    coordinates = None
+    if filename_locations is not None:
+        locations = Graph.read_triplets(filename_locations, float)
+        coordinates = locations[np.argsort(locations[:, 0]), 1:]
+
+    graph.write_instance_to_directory(directory, dtype, scale, coordinates)
+    return graph
+
+
+# Converting every data/comparable instance into graph-<size> directory next to its text files
+def convert_comparable_data(vehicles_and_capacities, directory="data/comparable", dtype=np.float64, scale=None):
+    for filename_edges in sorted(glob.glob(os.path.join(directory, "graph-edges*.txt"))):
+        size = os.path.basename(filename_edges)[len("graph-edges"):-len(".txt")]
+        convert_text_instance(
+            filename_edges=filename_edges,
+            filename_vertices=os.path.join(directory, f"graph-vertices{size}.txt"),
+            directory=os.path.join(directory, f"graph-{size}"),
+            vehicles_and_capacities=vehicles_and_capacities,
+            dtype=dtype,
+            scale=scale
+        )
+
+
+if __name__ == "__main__":
+    # Distances of comparable data have two decimal places, stored exactly as integers scaled by 100
+    convert_comparable_data(
+        vehicles_and_capacities=[(8, 15), (3, 10), (5, 8)],
+        dtype=np.int32,
+        scale=100
+    )
@@ -0,0 +1,22 @@
+from architecture.FitnessCache import FitnessCache
+from concurrent.futures import ProcessPoolExecutor
+
+# Worker process state - graph is shipped to every worker once, when the pool starts
+worker_graph = None
+worker_cache = None
+
+
+# Initializing worker process
+def init_worker(graph, cache_size=None):
+    global worker_graph, worker_cache
+    worker_graph = graph
+    worker_cache = FitnessCache(cache_size) if cache_size is not None else None
+
+
+# Creating process pool working on given graph, every worker gets own fitness cache of given size
+# (scripts using it must guard their code with if __name__ == "__main__" on non-fork platforms)
+def create_pool(graph, workers, cache_size=None):
+    if workers < 1:
+        raise ValueError("At least one worker is required.")
+
+    return ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(graph, cache_size))
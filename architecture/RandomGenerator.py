@@ -0,0 +1,19 @@
+import numpy as np
+import random
+
+
+class RandomGenerator:
+
+    # RandomGenerator class constructor - Python and NumPy generators seeded from a single seed sequence
+    def __init__(self, seed=None):
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+
+        self.random = random.Random(int.from_bytes(self.seed_sequence.generate_state(4).tobytes(), 'little'))
+        self.numpy = np.random.default_rng(self.seed_sequence)
+
+    # Creating independent generators (e.g. for parallel workers or restarts)
+    def spawn(self, count):
+        return [RandomGenerator(child) for child in self.seed_sequence.spawn(count)]
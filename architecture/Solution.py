@@ -0,0 +1,75 @@
+from array import array
+
+
+class Solution:
+    __slots__ = ('tour', 'cost', 'route_offsets', 'depots', 'capacities', 'loads')
+
+    # Solution class constructor - giant tour (clients order, tuple) and its split into routes (int arrays)
+    # route_offsets - tour positions of route begins followed by tour length (route i is tour[offsets[i]:offsets[i + 1]])
+    # depots, capacities - warehouse index and vehicle capacity of every route
+    # loads - initial bikes load and batteries load of every route, flattened in routes order
+    # Route lists with warehouses on both ends are created only on request
+    # (tour is kept as tuple - copying the evaluated list into typed array costs more than resumed split)
+    def __init__(self, tour, cost, route_offsets, depots, capacities, loads):
+        self.tour = tuple(tour)
+        self.cost = cost
+        self.route_offsets = route_offsets
+        self.depots = depots
+        self.capacities = capacities
+        self.loads = loads
+
+    # Creating Solution from Python sequences of its routes
+    @classmethod
+    def from_lists(cls, tour, cost, route_offsets, depots, capacities, loads):
+        return cls(
+            tour,
+            cost,
+            array('i', route_offsets),
+            array('i', depots),
+            array('i', capacities),
+            array('i', loads)
+        )
+
+    # Getting route with warehouse added to both ends
+    def get_route(self, route_idx):
+        depot = self.depots[route_idx]
+        return [depot, *self.tour[self.route_offsets[route_idx]:self.route_offsets[route_idx + 1]], depot]
+
+    def get_routes(self):
+        return [self.get_route(route_idx) for route_idx in range(len(self.depots))]
+
+    def get_vehicles(self):
+        return self.capacities.tolist()
+
+    # Getting [initial bikes load, initial batteries load] of every route
+    def get_init_loads(self):
+        return [self.loads[idx:idx + 2].tolist() for idx in range(0, len(self.loads), 2)]
+
+    # Getting solution as (solution, cost, routes, vehicles, init_loads) tuple, algorithms output format
+    def to_tuple(self):
+        return list(self.tour), self.cost, self.get_routes(), self.get_vehicles(), self.get_init_loads()
+
+    # Getters of tuple items in to_tuple() order
+    tuple_items = (
+        lambda solution: list(solution.tour),
+        lambda solution: solution.cost,
+        get_routes,
+        get_vehicles,
+        get_init_loads
+    )
+
+    # Solution is read as its tuple (see to_tuple()), e.g. by display_solution(),
+    # only the item read is created
+    def __getitem__(self, idx):
+        if isinstance(idx, slice):
+            return self.to_tuple()[idx]
+        return Solution.tuple_items[idx](self)
+
+    def __iter__(self):
+        return iter(self.to_tuple())
+
+    def __len__(self):
+        return 5
+
+    def __repr__(self):
+        return repr(self.to_tuple())
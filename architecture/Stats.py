@@ -0,0 +1,91 @@
+from contextlib import contextmanager
+import time
+
+
+class Stats:
+
+    # Stats class constructor - opt-in run instrumentation, filled in place by algorithms given it
+    # counters - named counts (evaluations, feasibility checks, split restarts, moves, cache hits, ...)
+    # timers - named phase times in seconds, measured with perf_counter
+    def __init__(self):
+        self.counters = {}
+        self.timers = {}
+        self.lap_time = None
+
+        # Nested runs (e.g. descent inside multistart) share counters of the outermost run
+        self.run_depth = 0
+        self.run_snapshot = None
+
+    # Adding value to counter
+    def count(self, name, value=1):
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    # Adding time to phase timer
+    def add_time(self, name, seconds):
+        self.timers[name] = self.timers.get(name, 0.0) + seconds
+
+    # Timing block as given phase
+    @contextmanager
+    def phase(self, name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start_time)
+
+    # Wrapping function, so that its calls are timed as given phase
+    def timed(self, name, function):
+        def timed_function(*args, **kwargs):
+            start_time = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add_time(name, time.perf_counter() - start_time)
+        return timed_function
+
+    # Adding time since the previous lap to given phase (phase between callbacks of external code),
+    # without phase name only the lap is started
+    def lap(self, name=None):
+        lap_time = time.perf_counter()
+        if name is not None and self.lap_time is not None:
+            self.add_time(name, lap_time - self.lap_time)
+        self.lap_time = lap_time
+
+    # Getting evaluator and cache counters
+    @staticmethod
+    def get_counters(evaluator, cache):
+        counters = {
+            'evaluations': evaluator.num_evaluations,
+            'feasibility_checks': evaluator.num_feasibility_checks,
+            'split_restarts': evaluator.num_split_restarts
+        }
+        if cache is not None:
+            counters['cache_hits'] = cache.hits
+            counters['cache_misses'] = cache.misses
+        return counters
+
+    # Starting algorithm run - evaluator and cache counters are snapshot by the outermost run
+    def start_run(self, evaluator, cache=None):
+        if self.run_depth == 0:
+            self.run_snapshot = (time.perf_counter(), self.get_counters(evaluator, cache))
+        self.run_depth += 1
+
+    # Ending algorithm run - the outermost run adds counters differences and its time
+    def end_run(self, evaluator, cache=None):
+        self.run_depth -= 1
+        if self.run_depth == 0:
+            start_time, counters = self.run_snapshot
+            for name, value in self.get_counters(evaluator, cache).items():
+                self.count(name, value - counters.get(name, 0))
+            self.add_time('run', time.perf_counter() - start_time)
+
+    # Merging stats of other run (e.g. from worker process) into these,
+    # its run time is kept apart as worker run time, not to add up with wall time of this run
+    def merge(self, other):
+        for name, value in other.counters.items():
+            self.count(name, value)
+        for name, seconds in other.timers.items():
+            self.add_time('worker_run' if name == 'run' else name, seconds)
+
+    def __repr__(self):
+        return f"Stats(counters={self.counters}, timers={ {name: round(seconds, 6) for name, seconds in self.timers.items()} })"
@@ -0,0 +1,87 @@
+import numpy as np
+import json
+import time
+
+# Binary trace record (written with native numpy layout, read back with read_trace())
+TRACE_DTYPE = np.dtype([('elapsed', '<f8'), ('evaluations', '<i8'), ('cost', '<f8')])
+
+
+class Trace:
+
+    # Trace class constructor - incumbent cost trace streamed to file as (elapsed, evaluations, cost) records,
+    # JSON lines for .jsonl files, TRACE_DTYPE binary records otherwise
+    # min_interval - downsampling, incumbent improvements closer than given seconds to the last written record
+    #                are held back, only the last held one is written (at the latest on close)
+    # Memory use does not depend on run length: the file is written as the run goes
+    def __init__(self, filename, min_interval=0.0):
+        self.filename = filename
+        self.min_interval = min_interval
+        self.binary = not filename.endswith(".jsonl")
+        self.file = open(filename, 'wb' if self.binary else 'w')
+
+        self.evaluator = None
+        self.start_time = None
+        self.start_evaluations = 0
+        self.best_cost = float('inf')
+        self.last_elapsed = None
+        self.pending = None
+
+    # Starting traced run, elapsed time and evaluations are counted from now
+    def start(self, evaluator):
+        self.evaluator = evaluator
+        self.start_time = time.perf_counter()
+        self.start_evaluations = evaluator.num_evaluations
+
+    # Recording cost found by algorithm, only improvements of the incumbent cost are traced
+    # evaluations - evaluations done so far, evaluations of the traced evaluator by default
+    # (evaluations of worker processes are not counted there)
+    def record(self, cost, evaluations=None):
+        if cost >= self.best_cost:
+            return
+        self.best_cost = cost
+
+        elapsed = time.perf_counter() - self.start_time
+        if evaluations is None:
+            evaluations = self.evaluator.num_evaluations - self.start_evaluations
+        self.pending = (elapsed, evaluations, cost)
+
+        if self.last_elapsed is None or elapsed - self.last_elapsed >= self.min_interval:
+            self.write_pending()
+
+    # Writing held back record
+    def write_pending(self):
+        elapsed, evaluations, cost = self.pending
+        if self.binary:
+            self.file.write(np.array([self.pending], dtype=TRACE_DTYPE).tobytes())
+        else:
+            self.file.write(json.dumps({'elapsed': elapsed, 'evaluations': evaluations, 'cost': cost}) + "\n")
+
+        # Flushed at once, so that trace can be followed while the run goes on
+        self.file.flush()
+        self.last_elapsed = elapsed
+        self.pending = None
+
+    # Closing trace file, the last incumbent is always written
+    def close(self):
+        if self.pending is not None:
+            self.write_pending()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Reading trace file as TRACE_DTYPE array (fields: elapsed, evaluations, cost)
+def read_trace(filename):
+    if not filename.endswith(".jsonl"):
+        return np.fromfile(filename, dtype=TRACE_DTYPE)
+
+    with open(filename, 'r') as file:
+        records = [json.loads(line) for line in file if line.strip()]
+    return np.array(
+        [(record['elapsed'], record['evaluations'], record['cost']) for record in records],
+        dtype=TRACE_DTYPE
+    )
@@ -17,16 +17,35 @@ class Neighborhood(Enum):
     SWAP = 2
 
 
+# [Neighborhood search] improving move selection type
+class Improvement(Enum):
+    BEST_IMPROVEMENT = 1
+    FIRST_IMPROVEMENT = 2
+
+
+# [Solution evaluation] splitting solution into routes
+class Split(Enum):
+    GREEDY = 1
+    OPTIMAL = 2
+
+
 # [Evolutionary algorithms] crossover type
 class Crossover(Enum):
     ORDER_CROSSOVER = 1
     SINGLE_POINT_CROSSOVER = 2
 
 
+# [Instance generator] vertices coordinates layout
+class Layout(Enum):
+    UNIFORM = 1
+    CLUSTERED = 2
+
+
 # Displaying algorithm output
 def display_solution(algorithm_output):
-    print(f"BEST SOLUTION =  {algorithm_output[0]}")
-    print(f"TOTAL COST = {algorithm_output[1]}")
+    solution, cost, routes, vehicles, init_loads = algorithm_output
+    print(f"BEST SOLUTION =  {solution}")
+    print(f"TOTAL COST = {cost}")
     print("ROUTES (Index: Vehicle capacity | Initial bikes load | Initial batteries load | [Route]):")
-    for idx, route in enumerate(algorithm_output[2]):
-        print(f"{idx:3}: {algorithm_output[3][idx]:5} | {algorithm_output[4][idx][0]:5}| {algorithm_output[4][idx][1]:5} | {route}")
+    for idx, route in enumerate(routes):
+        print(f"{idx:3}: {vehicles[idx]:5} | {init_loads[idx][0]:5}| {init_loads[idx][1]:5} | {route}")
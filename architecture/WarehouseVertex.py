@@ -1,4 +1,6 @@
 from architecture.Vehicle import Vehicle
+from bisect import bisect
+from itertools import accumulate
 import random
 
 
@@ -10,10 +12,11 @@ class WarehouseVertex:
         self.latitude = latitude
         self.longitude = longitude
 
-    # Probabilistic vehicle selection
-    def select_vehicle(self):
-        capacities = [vehicle.capacity for vehicle in self.list_vehicles]
-        total_capacity = sum(capacities)
-        probabilities = [capacity / total_capacity for capacity in capacities]
-        chosen_vehicle = random.choices(self.list_vehicles, probabilities)[0]
-        return chosen_vehicle
+        # Cumulative selection weights (proportional to vehicle capacity)
+        self.cumulative_capacities = list(accumulate(vehicle.capacity for vehicle in self.list_vehicles))
+
+    # Probabilistic vehicle selection (rng - random.Random instance, global generator by default)
+    def select_vehicle(self, rng=random):
+        total_capacity = self.cumulative_capacities[-1]
+        vehicle_idx = bisect(self.cumulative_capacities, rng.random() * total_capacity, 0, len(self.list_vehicles) - 1)
+        return self.list_vehicles[vehicle_idx]
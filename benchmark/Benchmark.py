@@ -0,0 +1,314 @@
+from algorithms.Genetic import genetic_algorithm
+from algorithms.HybridGenetic import hybrid_genetic_algorithm
+from algorithms.MultistartDescent import multistart_descent
+from algorithms.SimulatedAnnealing import simulated_annealing
+from architecture.Generator import generate_instance
+from architecture.Instance import read_instance, read_text_instance
+from architecture.Utils import Algorithm, Neighborhood, Crossover, Layout
+from concurrent.futures import ProcessPoolExecutor
+import multiprocessing
+import statistics
+import argparse
+import resource
+import json
+import time
+import sys
+import os
+
+# Run from repository root: python -m benchmark.Benchmark [options]
+
+vehicles_and_capacities = [
+    (8, 15),
+    (3, 10),
+    (5, 8)
+]
+
+# data/comparable instances (file size suffixes)
+comparable_instances = ['10', '30', '50', '100']
+
+# Generated instances (number of vertices, number of warehouses, layout), cached in data/generated (not tracked)
+generated_instances = {
+    'uniform-200': (200, 10, Layout.UNIFORM),
+    'clustered-500': (500, 20, Layout.CLUSTERED)
+}
+
+algorithms = {
+    Algorithm.MULTISTART_DESCENT: multistart_descent,
+    Algorithm.SIMULATED_ANNEALING: simulated_annealing,
+    Algorithm.GENETIC_ALGORITHM: genetic_algorithm,
+    Algorithm.HYBRID_GENETIC_ALGORITHM: hybrid_genetic_algorithm
+}
+
+
+# Default algorithm parameters, as set in main.py
+default_params = {
+    Algorithm.MULTISTART_DESCENT: {
+        'num_iterations': 10
+    },
+    Algorithm.SIMULATED_ANNEALING: {
+        'num_iterations': 80,
+        'initial_temperature': 220,
+        'final_temperature': 15
+    },
+    Algorithm.GENETIC_ALGORITHM: {
+        'num_generations': 50
+    },
+    Algorithm.HYBRID_GENETIC_ALGORITHM: {
+        'num_generations': 10,
+        'descent_percent': 30
+    }
+}
+
+
+# Getting benchmarked algorithm configurations (algorithm, parameters), as set in main.py
+def get_configurations():
+    configurations = []
+
+    for neighborhood_type in Neighborhood:
+        configurations.append((Algorithm.MULTISTART_DESCENT, {
+            **default_params[Algorithm.MULTISTART_DESCENT],
+            'neighborhood_type': neighborhood_type
+        }))
+        configurations.append((Algorithm.SIMULATED_ANNEALING, {
+            **default_params[Algorithm.SIMULATED_ANNEALING],
+            'neighborhood_type': neighborhood_type
+        }))
+
+    for crossover_type in Crossover:
+        configurations.append((Algorithm.GENETIC_ALGORITHM, {
+            **default_params[Algorithm.GENETIC_ALGORITHM],
+            'crossover_type': crossover_type
+        }))
+
+        for neighborhood_type in Neighborhood:
+            configurations.append((Algorithm.HYBRID_GENETIC_ALGORITHM, {
+                **default_params[Algorithm.HYBRID_GENETIC_ALGORITHM],
+                'crossover_type': crossover_type,
+                'neighborhood_type': neighborhood_type
+            }))
+
+    return configurations
+
+
+# Getting job key identifying results compared between benchmark runs
+def get_job_key(algorithm, params, instance):
+    params = ",".join(f"{name}={value.name if hasattr(value, 'name') else value}" for name, value in params.items())
+    return f"{algorithm.name}[{params}]@{instance}"
+
+
+# Generating missing generated instances
+def prepare_instances(instances):
+    for instance in instances:
+        if instance in generated_instances and not os.path.exists(os.path.join("data/generated", instance)):
+            num_vertices, num_warehouses, layout = generated_instances[instance]
+            generate_instance(
+                num_vertices,
+                num_warehouses,
+                vehicles_and_capacities,
+                layout,
+                filename_instance=os.path.join("data/generated", instance),
+                seed=0
+            )
+
+
+# Loading benchmark instance
+def load_instance(instance):
+    if instance in generated_instances:
+        return read_instance(os.path.join("data/generated", instance), vehicles_and_capacities)
+
+    return read_text_instance(
+        f"data/comparable/graph-edges{instance}.txt",
+        f"data/comparable/graph-vertices{instance}.txt",
+        vehicles_and_capacities
+    )
+
+
+# Running single job in its own process, returns run record
+def run_job(job):
+    graph = load_instance(job['instance'])
+    evaluator = graph.get_evaluator()
+    evaluator.reset_counters()
+
+    start_time = time.perf_counter()
+    algorithm_instance, all_solutions = algorithms[job['algorithm']](
+        graph,
+        time_limit=job['time_limit'],
+        seed=job['seed'],
+        **job['params']
+    )
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        'key': job['key'],
+        'repeat': job['repeat'],
+        'seed': job['seed'],
+        'wall_time': wall_time,
+        'evaluations': evaluator.num_evaluations,
+        'evaluations_per_second': evaluator.num_evaluations / wall_time,
+        'best_cost': algorithm_instance.cost,
+        'peak_memory': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,  # Linux reports KiB
+        'improvements': [(time_point - start_time, evaluations, cost)
+                         for time_point, evaluations, cost in evaluator.improvements]
+    }
+
+
+# Getting time and evaluations of the first improvement reaching target cost
+def get_time_to_target(improvements, target):
+    for elapsed, evaluations, cost in improvements:
+        if cost <= target:
+            return elapsed, evaluations
+    return None, None
+
+
+# Summarizing runs of every job with medians, time to target is measured to the baseline best cost
+# (or the best cost over repeats without baseline) increased by target gap
+def summarize(runs, baseline, target_gap):
+    runs_by_key = {}
+    for run in runs:
+        runs_by_key.setdefault(run['key'], []).append(run)
+
+    summary = {}
+    for key, job_runs in runs_by_key.items():
+        reference = baseline[key]['best_cost'] if key in baseline else min(run['best_cost'] for run in job_runs)
+        target = round(reference * (1 + target_gap), 2)
+
+        for run in job_runs:
+            run['time_to_target'], run['evaluations_to_target'] = get_time_to_target(run['improvements'], target)
+        reached = [run['time_to_target'] for run in job_runs if run['time_to_target'] is not None]
+
+        summary[key] = {
+            'runs': len(job_runs),
+            'target': target,
+            'reached_target': len(reached),
+            'wall_time': statistics.median(run['wall_time'] for run in job_runs),
+            'evaluations_per_second': statistics.median(run['evaluations_per_second'] for run in job_runs),
+            'best_cost': statistics.median(run['best_cost'] for run in job_runs),
+            'time_to_target': statistics.median(reached) if len(reached) == len(job_runs) else None,
+            'peak_memory': max(run['peak_memory'] for run in job_runs)
+        }
+
+    return summary
+
+
+# Comparing summary with baseline, returns regressions (key, metric, baseline value, current value)
+# Metrics regress by more than tolerance: higher cost, time or memory, lower throughput, lost time to target
+# (time differences below time resolution are treated as noise)
+def compare_with_baseline(summary, baseline, tolerance, time_resolution=0.05):
+    regressions = []
+    for key, current in summary.items():
+        if key not in baseline:
+            continue
+        base = baseline[key]
+
+        if current['best_cost'] > base['best_cost'] * (1 + tolerance):
+            regressions.append((key, 'best_cost', base['best_cost'], current['best_cost']))
+
+        if current['peak_memory'] > base['peak_memory'] * (1 + tolerance):
+            regressions.append((key, 'peak_memory', base['peak_memory'], current['peak_memory']))
+
+        if current['evaluations_per_second'] < base['evaluations_per_second'] * (1 - tolerance) \
+                and current['wall_time'] >= time_resolution:
+            regressions.append((key, 'evaluations_per_second', base['evaluations_per_second'],
+                                current['evaluations_per_second']))
+
+        for metric in ('wall_time', 'time_to_target'):
+            if base[metric] is None:
+                continue
+            if current[metric] is None or (current[metric] > base[metric] * (1 + tolerance)
+                                           and current[metric] - base[metric] >= time_resolution):
+                regressions.append((key, metric, base[metric], current[metric]))
+
+    return regressions
+
+
+# Running benchmark jobs one at a time, every job in a fresh process (own peak memory, no shared caches)
+def run_benchmark(instances, algorithm_types, repeats, time_limit, seed=0):
+    prepare_instances(instances)
+
+    jobs = []
+    for instance in instances:
+        for algorithm, params in get_configurations():
+            if algorithm not in algorithm_types:
+                continue
+            for repeat in range(repeats):
+                jobs.append({
+                    'key': get_job_key(algorithm, params, instance),
+                    'algorithm': algorithm,
+                    'params': params,
+                    'instance': instance,
+                    'repeat': repeat,
+                    'seed': seed + repeat,
+                    'time_limit': time_limit
+                })
+
+    runs = []
+    with ProcessPoolExecutor(max_workers=1,
+                             mp_context=multiprocessing.get_context("spawn"),
+                             max_tasks_per_child=1) as pool:
+        for idx, run in enumerate(pool.map(run_job, jobs), start=1):
+            print(f"[{idx}/{len(jobs)}] {run['key']} #{run['repeat']}: cost {run['best_cost']}, "
+                  f"{run['wall_time']:.2f} s, {run['evaluations_per_second']:.0f} evaluations/s")
+            runs.append(run)
+
+    return runs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark algorithms on comparable and generated instances.")
+    parser.add_argument("--instances", nargs="+", default=comparable_instances + list(generated_instances),
+                        choices=comparable_instances + list(generated_instances))
+    parser.add_argument("--algorithms", nargs="+", default=[algorithm.name for algorithm in algorithms],
+                        choices=[algorithm.name for algorithm in algorithms])
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--target-gap", type=float, default=0.05, help="time to target cost = baseline cost * (1 + gap)")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="relative change flagged as regression")
+    parser.add_argument("--baseline", default="benchmark/baseline.json")
+    parser.add_argument("--save-baseline", action="store_true", help="save summary as new baseline")
+    parser.add_argument("--output", default="output/benchmark.json")
+    args = parser.parse_args()
+
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+
+    runs = run_benchmark(
+        args.instances,
+        [Algorithm[name] for name in args.algorithms],
+        args.repeats,
+        args.time_limit,
+        args.seed
+    )
+    summary = summarize(runs, baseline, args.target_gap)
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, 'w') as file:
+        json.dump({'summary': summary, 'runs': runs}, file, indent=4)
+
+    print("\nSUMMARY (medians)")
+    for key, job_summary in summary.items():
+        time_to_target = job_summary['time_to_target']
+        print(f"{key}: cost {round(job_summary['best_cost'], 2)}, {job_summary['wall_time']:.2f} s, "
+              f"{job_summary['evaluations_per_second']:.0f} evaluations/s, "
+              f"time to target {'-' if time_to_target is None else f'{time_to_target:.3f} s'} "
+              f"({job_summary['reached_target']}/{job_summary['runs']} runs), "
+              f"peak memory {job_summary['peak_memory'] / 2 ** 20:.0f} MiB")
+
+    regressions = compare_with_baseline(summary, baseline, args.tolerance)
+    if regressions:
+        print("\nREGRESSIONS")
+        for key, metric, base_value, value in regressions:
+            print(f"{key}: {metric} {base_value} -> {value}")
+    elif baseline:
+        print("\nNo regressions against baseline.")
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline) or ".", exist_ok=True)
+        with open(args.baseline, 'w') as file:
+            json.dump(summary, file, indent=4)
+
+    # Failing exit status, so that regressions can gate CI
+    if regressions:
+        sys.exit(1)
@@ -0,0 +1,300 @@
+from architecture.Utils import Algorithm, Neighborhood, Crossover, Improvement, Split
+from benchmark.Benchmark import algorithms, comparable_instances, generated_instances, default_params, \
+    get_job_key, prepare_instances, load_instance
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import statistics
+import itertools
+import argparse
+import inspect
+import json
+import time
+import ast
+import sys
+import os
+
+# Run from repository root: python -m benchmark.Runner [options], e.g.
+# python -m benchmark.Runner --algorithms MULTISTART_DESCENT --instances 10 30 --repeats 20 \
+#     --param num_iterations=10,30 --workers 8
+# python -m benchmark.Runner --algorithms GENETIC_ALGORITHM --param split_type=OPTIMAL --param max_route_length=20,None
+
+# Parameters given by enum member names
+enum_params = {
+    'improvement_type': Improvement,
+    'split_type': Split
+}
+
+# output/iter comparison file names, e.g. hg_1px_swap10.txt
+iter_names = {
+    Algorithm.MULTISTART_DESCENT: 'md',
+    Algorithm.SIMULATED_ANNEALING: 'sa',
+    Algorithm.GENETIC_ALGORITHM: 'ga',
+    Algorithm.HYBRID_GENETIC_ALGORITHM: 'hg'
+}
+crossover_names = {
+    Crossover.ORDER_CROSSOVER: 'ox',
+    Crossover.SINGLE_POINT_CROSSOVER: '1px'
+}
+
+# Graphs loaded by worker process, by instance name (every instance is read once per worker)
+worker_graphs = {}
+
+
+# Parsing parameter values given as name=value1,value2,...
+# (enum parameters by member names, others as Python literals, e.g. 0.5, True, None)
+def parse_param(text):
+    name, _, values = text.partition("=")
+    if not name or not values:
+        raise argparse.ArgumentTypeError(f"Parameter '{text}' is not given as name=value1,value2,...")
+
+    parsed_values = []
+    for value in values.split(","):
+        if name in enum_params:
+            if value not in enum_params[name].__members__:
+                raise argparse.ArgumentTypeError(f"Unknown {name} value '{value}'.")
+            parsed_values.append(enum_params[name][value])
+            continue
+        try:
+            parsed_values.append(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            parsed_values.append(value)
+
+    return name, parsed_values
+
+
+# Getting experiment configurations (algorithm, parameters) - every algorithm runs with its default parameters
+# and every combination of neighborhoods, crossovers and parameter values it takes
+def get_configurations(algorithm_types, neighborhood_types, crossover_types, param_values):
+    configurations = []
+    for algorithm in algorithm_types:
+        accepted = inspect.signature(algorithms[algorithm]).parameters
+
+        grid = {}
+        if 'neighborhood_type' in accepted:
+            grid['neighborhood_type'] = neighborhood_types
+        if 'crossover_type' in accepted:
+            grid['crossover_type'] = crossover_types
+        for name, values in param_values.items():
+            if name in accepted:
+                grid[name] = values
+
+        for values in itertools.product(*grid.values()):
+            configurations.append((algorithm, {**default_params[algorithm], **dict(zip(grid, values))}))
+
+    return configurations
+
+
+# Getting output/iter comparison file name of configuration on instance, varied parameters are added to its name
+def get_iter_filename(algorithm, params, instance, varied_params):
+    parts = [iter_names[algorithm]]
+    if 'crossover_type' in params:
+        parts.append(crossover_names[params['crossover_type']])
+    if 'neighborhood_type' in params:
+        parts.append(params['neighborhood_type'].name.lower())
+    for name in varied_params:
+        if name in params:
+            value = params[name]
+            parts.append(f"{name}={value.name if hasattr(value, 'name') else value}")
+
+    return "_".join(parts) + f"{instance}.txt"
+
+
+# Running single job in worker process, returns run record
+def run_job(job):
+    if job['instance'] not in worker_graphs:
+        worker_graphs[job['instance']] = load_instance(job['instance'])
+    graph = worker_graphs[job['instance']]
+
+    evaluator = graph.get_evaluator()
+    evaluator.reset_counters()
+
+    start_time = time.perf_counter()
+    algorithm_instance, all_solutions = algorithms[job['algorithm']](
+        graph,
+        time_limit=job['time_limit'],
+        seed=job['seed'],
+        **job['params']
+    )
+    wall_time = time.perf_counter() - start_time
+
+    return {
+        'key': job['key'],
+        'iter_filename': job['iter_filename'],
+        'repeat': job['repeat'],
+        'seed': job['seed'],
+        'wall_time': wall_time,
+        'evaluations': evaluator.num_evaluations,
+        'best_cost': algorithm_instance.cost,
+        'solution': list(algorithm_instance.to_tuple()),
+        'all_solutions': [float(value) for value in all_solutions]
+    }
+
+
+# Reading run records streamed to results file
+def read_records(filename):
+    if not os.path.exists(filename):
+        return []
+
+    with open(filename, 'r') as file:
+        return [json.loads(line) for line in file if line.strip()]
+
+
+# Getting instance size, larger instances are scheduled first among jobs of the same estimate
+def get_instance_size(instance):
+    if instance in generated_instances:
+        return generated_instances[instance][0]
+    return int(instance)
+
+
+# Scheduling jobs longest first - estimated by median wall time of the same configuration in previous records,
+# or by time limit for configurations not run before
+def schedule_jobs(jobs, records):
+    wall_times = {}
+    for record in records:
+        wall_times.setdefault(record['key'], []).append(record['wall_time'])
+
+    def get_estimate(job):
+        estimate = statistics.median(wall_times[job['key']]) if job['key'] in wall_times else job['time_limit']
+        return estimate, get_instance_size(job['instance'])
+
+    return sorted(jobs, key=get_estimate, reverse=True)
+
+
+# Writing output/iter comparison files (runs in repeats order, formatted as by main.py)
+def write_iter_files(records, directory):
+    records_by_filename = {}
+    for record in records:
+        records_by_filename.setdefault(record['iter_filename'], []).append(record)
+
+    os.makedirs(directory, exist_ok=True)
+    for filename, file_records in records_by_filename.items():
+        with open(os.path.join(directory, filename), 'w') as file:
+            for record in sorted(file_records, key=lambda record: record['repeat']):
+                file.write(f"{record['repeat'] + 1}:\n {tuple(record['solution'])}\n {record['all_solutions']}\n\n")
+
+
+# Running experiment jobs on process pool, every finished run is appended to results file at once
+# resume - runs already in results file are kept and not run again, otherwise results file is started anew
+# (its previous runs are still used to estimate job times)
+def run_experiments(configurations, instances, repeats, time_limit, workers, results_filename, iter_directory,
+                    seed=0, varied_params=(), resume=False):
+    prepare_instances(instances)
+
+    records = read_records(results_filename)
+    done = {(record['key'], record['repeat']) for record in records} if resume else set()
+
+    jobs = []
+    for instance in instances:
+        for algorithm, params in configurations:
+            key = get_job_key(algorithm, params, instance)
+            for repeat in range(repeats):
+                if (key, repeat) in done:
+                    continue
+                jobs.append({
+                    'key': key,
+                    'iter_filename': get_iter_filename(algorithm, params, instance, varied_params),
+                    'algorithm': algorithm,
+                    'params': params,
+                    'instance': instance,
+                    'repeat': repeat,
+                    'seed': seed + repeat,
+                    'time_limit': time_limit
+                })
+    jobs = schedule_jobs(jobs, records)
+
+    if not resume:
+        records = []
+    os.makedirs(os.path.dirname(results_filename) or ".", exist_ok=True)
+    with open(results_filename, 'a' if resume else 'w') as results_file, \
+            ProcessPoolExecutor(max_workers=workers) as pool:
+        # Jobs are started in submission order
+        futures = [pool.submit(run_job, job) for job in jobs]
+        for idx, future in enumerate(as_completed(futures), start=1):
+            record = future.result()
+            results_file.write(json.dumps(record) + "\n")
+            results_file.flush()
+            records.append(record)
+
+            print(f"[{idx}/{len(jobs)}] {record['key']} #{record['repeat']}: cost {record['best_cost']}, "
+                  f"{record['wall_time']:.2f} s")
+
+    write_iter_files(records, iter_directory)
+    return records
+
+
+# Smoke run - every configuration runs once in this process on given instance, its record must be written
+# as JSON (the results file format), raises on the first failing configuration
+def smoke_run(configurations, instance, time_limit=1, seed=0):
+    prepare_instances([instance])
+
+    for algorithm, params in configurations:
+        key = get_job_key(algorithm, params, instance)
+        record = run_job({
+            'key': key,
+            'iter_filename': get_iter_filename(algorithm, params, instance, ()),
+            'algorithm': algorithm,
+            'params': params,
+            'instance': instance,
+            'repeat': 0,
+            'seed': seed,
+            'time_limit': time_limit
+        })
+        json.loads(json.dumps(record))
+        print(f"{key}: cost {record['best_cost']}, ok")
+
+
+if __name__ == "__main__":
+    algorithm_names = [algorithm.name for algorithm in algorithms]
+    instance_names = comparable_instances + list(generated_instances)
+
+    parser = argparse.ArgumentParser(description="Run algorithms x parameter sets x instances x repeats in parallel.")
+    parser.add_argument("--algorithms", nargs="+", default=algorithm_names, choices=algorithm_names)
+    parser.add_argument("--neighborhoods", nargs="+", default=[neighborhood.name for neighborhood in Neighborhood],
+                        choices=[neighborhood.name for neighborhood in Neighborhood])
+    parser.add_argument("--crossovers", nargs="+", default=[crossover.name for crossover in Crossover],
+                        choices=[crossover.name for crossover in Crossover])
+    parser.add_argument("--param", type=parse_param, action="append", default=[], metavar="NAME=VALUE[,VALUE...]",
+                        help="parameter values, every combination is run by algorithms taking the parameter")
+    parser.add_argument("--instances", nargs="+", default=comparable_instances, choices=instance_names)
+    parser.add_argument("--repeats", type=int, default=20)
+    parser.add_argument("--time-limit", type=float, default=60)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--results", default="output/runs.jsonl", help="run records, appended as runs finish")
+    parser.add_argument("--iter-directory", default="output/iter", help="comparison files written after all runs")
+    parser.add_argument("--resume", action="store_true", help="keep runs already in results file")
+    parser.add_argument("--smoke", action="store_true",
+                        help="run every configuration once on the first instance for 1 s, nothing is written")
+    args = parser.parse_args()
+
+    param_values = dict(args.param)
+    algorithm_types = [Algorithm[name] for name in args.algorithms]
+    for name in param_values:
+        if name in ('graph', 'time_limit', 'seed'):
+            parser.error(f"Parameter '{name}' is set by its own option.")
+        if not any(name in inspect.signature(algorithms[algorithm]).parameters for algorithm in algorithm_types):
+            parser.error(f"No selected algorithm takes parameter '{name}'.")
+
+    configurations = get_configurations(
+        algorithm_types,
+        [Neighborhood[name] for name in args.neighborhoods],
+        [Crossover[name] for name in args.crossovers],
+        param_values
+    )
+    if args.smoke:
+        smoke_run(configurations, args.instances[0], seed=args.seed)
+        sys.exit()
+
+    start_time = time.perf_counter()
+    run_experiments(
+        configurations,
+        args.instances,
+        args.repeats,
+        args.time_limit,
+        args.workers,
+        args.results,
+        args.iter_directory,
+        args.seed,
+        param_values,
+        args.resume
+    )
+    print(f"\nAll runs finished in {time.perf_counter() - start_time:.2f} s")
@@ -1,7 +1,7 @@
 import time
 
-from architecture.Utils import Algorithm, Crossover, Neighborhood, display_solution
-from architecture.Graph import Graph
+from architecture.Utils import Algorithm, Crossover, Improvement, Neighborhood, display_solution
+from architecture.Generator import generate_instance
 
 from algorithms.Genetic import genetic_algorithm
 from algorithms.HybridGenetic import hybrid_genetic_algorithm
@@ -14,26 +14,21 @@ vehicles_and_capacities = [
     (5, 8)     # 5 vehicles with capacity 8
 ]
 
-edges_range = (  # default values given
-    1.0,         # min distance between two nodes
-    10.0         # max
-)
+size = 10.0  # side of square vertices are placed in, distances between them are Euclidean
 vertices_range = (  # default values given
     0,              # min value for both client vertex capacity and items stored
     10              # max
 )
 
-# Setting graph parameters
-graph = Graph(
+# Setting graph parameters, new instance is written into edges and vertices files
+graph = generate_instance(
     num_vertices=7,
     num_warehouses=2,
     vehicles_and_capacities=vehicles_and_capacities,
-    generate_new_edges=True,
+    size=size,
+    vertices_range=vertices_range,
     filename_edges="data/graph-edges.txt",
-    edges_range=edges_range,
-    generate_new_vertices=True,
-    filename_vertices="data/graph-vertices.txt",
-    vertices_range=vertices_range
+    filename_vertices="data/graph-vertices.txt"
 )
 
 # Display clients params
@@ -65,6 +60,8 @@ if algorithm_type == Algorithm.MULTISTART_DESCENT or algorithm_type == Algorithm
     num_iterations = 10
     neighborhood_type = Neighborhood.INSERT
     # neighborhood_type = Neighborhood.SWAP
+    improvement_type = Improvement.BEST_IMPROVEMENT
+    # improvement_type = Improvement.FIRST_IMPROVEMENT
 
     with open("output/md.txt", 'w') as file:
         for i in range(runs):
@@ -77,7 +74,8 @@ if algorithm_type == Algorithm.MULTISTART_DESCENT or algorithm_type == Algorithm
                 graph=graph,
                 num_iterations=num_iterations,
                 time_limit=time_limit,
-                neighborhood_type=neighborhood_type
+                neighborhood_type=neighborhood_type,
+                improvement_type=improvement_type
             )
 
             end_time = time.time()